@@ -2,25 +2,115 @@
 """Who's That? - A kid-friendly photo identification app using VLM."""
 
 import atexit
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, Optional, Tuple
 from flask import Flask, Response, jsonify, request, render_template, send_file
-import cv2
+from flask.json.provider import DefaultJSONProvider
 import numpy as np
 import io
+import orjson
+import pybase64
 
-from config import HOST, PORT, DEBUG, APP_DIR, get_runtime_config, update_runtime_config
+from config import (
+    HOST, PORT, DEBUG, APP_DIR, VLM_SHEET_MAX_SIDE, get_runtime_config, update_runtime_config
+)
 from camera import camera
 from audio import tts
 from library import library
-from vlm import describe_scene, identify_subjects, chat_followup, build_initial_conversation, VLMError
+from jpeg import decode_jpeg
+from vlm import (
+    describe_scene_stream, identify_subjects_stream, chat_followup_stream,
+    build_initial_conversation, extend_conversation, close_vlm_session,
+    to_data_uri, VLMError
+)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson."""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs) -> Response:
+        # Hand orjson's bytes to the response directly (no str round-trip).
+        # Same argument handling as jsonify: one value, several positional
+        # values as a list, or keyword arguments as a dict.
+        if args and kwargs:
+            raise TypeError("response() takes either args or kwargs, not both")
+        if len(args) == 1:
+            obj = args[0]
+        else:
+            obj = list(args) if args else kwargs or None
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS),
+            mimetype=self.mimetype
+        )
 
-app = Flask(__name__)
 
-# Store current conversation state (in production, use sessions or Redis)
-current_conversation = {
-    "contact_sheet_b64": None,
-    "frame_b64": None,
-    "history": []
-}
+app = Flask(__name__)
+app.json = OrjsonProvider(app)
+
+# Conversation state per browser, keyed by a cookie. Each state dict is
+# replaced wholesale under the lock, never mutated, so readers can use it
+# after releasing the lock.
+CONVERSATION_COOKIE = "conversation_id"
+MAX_CONVERSATIONS = 16
+_conversations: "OrderedDict[str, Dict]" = OrderedDict()
+_conversations_lock = threading.RLock()
+
+
+def _store_conversation(conversation_id: str, state: Dict):
+    """Store a conversation, evicting the least recently used beyond the limit."""
+    with _conversations_lock:
+        _conversations[conversation_id] = state
+        _conversations.move_to_end(conversation_id)
+        while len(_conversations) > MAX_CONVERSATIONS:
+            _conversations.popitem(last=False)
+
+
+# Decode buffer reused across enrollments of same-sized browser frames
+_enroll_buf: Optional[np.ndarray] = None
+_enroll_lock = threading.Lock()
+
+# Speech for finished sentences is synthesized while the VLM keeps streaming
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_tts_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tts")
+
+
+def _collect_with_audio(chunks: Iterator[str]) -> Tuple[str, Optional[str]]:
+    """
+    Collect a streamed VLM response, synthesizing speech as sentences complete.
+
+    Returns:
+        Tuple of (response text, base64 MP3 audio or None)
+    """
+    text = ""
+    spoken = 0
+    clips = []
+    for chunk in chunks:
+        text += chunk
+        boundary = None
+        for boundary in _SENTENCE_END.finditer(text, spoken):
+            pass
+        if boundary is not None:
+            clips.append(_tts_pool.submit(tts.synthesize, text[spoken:boundary.start()]))
+            spoken = boundary.end()
+
+    if text[spoken:].strip():
+        clips.append(_tts_pool.submit(tts.synthesize, text[spoken:]))
+
+    # MP3 frames concatenate cleanly; skip audio entirely if any part failed
+    audio = [clip.result() for clip in clips]
+    if not audio or not all(audio):
+        return text, None
+    return text, pybase64.b64encode_as_string(b"".join(audio))
 
 
 @app.route("/")
@@ -51,25 +141,21 @@ def snapshot():
 @app.route("/describe", methods=["POST"])
 def describe():
     """One-shot scene description with TTS."""
-    import base64
     data = request.get_json()
 
-    # Get frame from request (browser camera) or fall back to Pi camera
+    # Get frame from request (browser camera) or fall back to Pi camera;
+    # camera frames go to the VLM as JPEG bytes and are encoded there
     if data and "frame" in data:
-        frame_b64 = data["frame"]
+        frame = data["frame"]
     else:
-        frame_b64 = camera.get_frame_base64()
+        frame = camera.get_frame_jpeg()
 
-    if frame_b64 is None:
+    if frame is None:
         return jsonify({"error": "No camera frame available"}), 503
 
     try:
-        description = describe_scene(frame_b64)
-        # Generate audio for browser playback
-        audio_data = tts.synthesize(description)
-        audio_b64 = None
-        if audio_data:
-            audio_b64 = base64.b64encode(audio_data).decode("utf-8")
+        # Generate audio for browser playback while the description streams
+        description, audio_b64 = _collect_with_audio(describe_scene_stream(frame))
         return jsonify({"description": description, "audio": audio_b64})
     except VLMError as e:
         return jsonify({"error": str(e)}), 503
@@ -78,7 +164,7 @@ def describe():
 @app.route("/enroll", methods=["POST"])
 def enroll():
     """Enroll a photo with a name label."""
-    import base64
+    global _enroll_buf
     data = request.get_json()
     if not data or "name" not in data:
         return jsonify({"error": "Name is required"}), 400
@@ -88,23 +174,24 @@ def enroll():
         return jsonify({"error": "Name cannot be empty"}), 400
 
     # Get frame from request (browser camera) or fall back to Pi camera
-    if data and "frame" in data:
-        # Decode base64 frame to numpy array
-        frame_bytes = base64.b64decode(data["frame"])
-        frame_array = np.frombuffer(frame_bytes, dtype=np.uint8)
-        frame = cv2.imdecode(frame_array, cv2.IMREAD_COLOR)
-    else:
-        frame = camera.get_frame()
+    with _enroll_lock:
+        if data and "frame" in data:
+            # Decode base64 frame straight into the reusable buffer
+            frame = decode_jpeg(pybase64.b64decode(data["frame"], validate=False), _enroll_buf)
+            if frame is not None:
+                _enroll_buf = frame
+        else:
+            frame = camera.get_frame()
 
-    if frame is None:
-        return jsonify({"error": "No camera frame available"}), 503
+        if frame is None:
+            return jsonify({"error": "No camera frame available"}), 503
 
-    result = library.enroll(name, frame)
+        result = library.enroll(name, frame)
 
     # Generate audio for browser playback
     audio_data = tts.synthesize(result["message"])
     if audio_data:
-        result["audio"] = base64.b64encode(audio_data).decode("utf-8")
+        result["audio"] = pybase64.b64encode_as_string(audio_data)
 
     return jsonify(result)
 
@@ -120,7 +207,10 @@ def get_library():
 def get_thumbnail(name):
     """Get thumbnail for a subject."""
     size = request.args.get("size", 150, type=int)
-    thumb = library.get_subject_thumbnail(name, size)
+    if size < 1:
+        return jsonify({"error": "Size must be a positive number"}), 400
+    # Thumbnails are rendered per request; don't let one be a full-size decode
+    thumb = library.get_subject_thumbnail(name, min(size, 1024))
     if thumb is None:
         return jsonify({"error": "Subject not found"}), 404
 
@@ -140,12 +230,11 @@ def get_photo(name, photo_id):
 @app.route("/library/<name>", methods=["DELETE"])
 def delete_subject(name):
     """Delete a subject entirely."""
-    import base64
     result = library.delete_subject(name)
     if result["success"]:
         audio_data = tts.synthesize(result["message"])
         if audio_data:
-            result["audio"] = base64.b64encode(audio_data).decode("utf-8")
+            result["audio"] = pybase64.b64encode_as_string(audio_data)
     return jsonify(result)
 
 
@@ -166,9 +255,6 @@ def clear_library():
 @app.route("/identify", methods=["POST"])
 def identify():
     """Identify subjects in current frame using contact sheet."""
-    import base64 as b64
-    global current_conversation
-
     data = request.get_json()
 
     # Check if we have any enrolled subjects
@@ -180,40 +266,47 @@ def identify():
         }), 400
 
     # Get contact sheet and current frame
-    contact_sheet_b64 = library.get_contact_sheet_base64()
-    if contact_sheet_b64 is None:
+    # Raw bytes; the VLM client base64-encodes them once
+    contact_sheet = library.get_contact_sheet_jpeg()
+    if contact_sheet is None:
         return jsonify({"error": "Could not generate contact sheet"}), 500
 
-    # Get frame from request (browser camera) or fall back to Pi camera
+    # Get frame from request (browser camera) or fall back to Pi camera;
+    # camera frames go to the VLM as JPEG bytes and are encoded there
     if data and "frame" in data:
-        frame_b64 = data["frame"]
+        frame = data["frame"]
     else:
-        frame_b64 = camera.get_frame_base64()
+        frame = camera.get_frame_jpeg()
 
-    if frame_b64 is None:
+    if frame is None:
         return jsonify({"error": "No camera frame available"}), 503
 
+    # Both images are sent now and kept in the conversation; build each
+    # data URI once rather than per use
+    contact_sheet_uri = to_data_uri(contact_sheet, VLM_SHEET_MAX_SIDE)
+    frame_uri = to_data_uri(frame)
+
     try:
-        response = identify_subjects(contact_sheet_b64, frame_b64)
+        # Generate audio for browser playback while the response streams
+        response, audio_b64 = _collect_with_audio(
+            identify_subjects_stream(contact_sheet_uri, frame_uri)
+        )
 
         # Store conversation state for follow-ups
-        current_conversation = {
-            "contact_sheet_b64": contact_sheet_b64,
-            "frame_b64": frame_b64,
-            "history": build_initial_conversation(contact_sheet_b64, frame_b64, response)
-        }
-
-        # Generate audio for browser playback
-        audio_data = tts.synthesize(response)
-        audio_b64 = None
-        if audio_data:
-            audio_b64 = b64.b64encode(audio_data).decode("utf-8")
+        conversation_id = request.cookies.get(CONVERSATION_COOKIE) or uuid.uuid4().hex
+        _store_conversation(conversation_id, {
+            "contact_sheet_b64": contact_sheet_uri,
+            "frame_b64": frame_uri,
+            "history": build_initial_conversation(contact_sheet_uri, frame_uri, response)
+        })
 
-        return jsonify({
+        result = jsonify({
             "response": response,
             "has_conversation": True,
             "audio": audio_b64
         })
+        result.set_cookie(CONVERSATION_COOKIE, conversation_id, httponly=True, samesite="Strict")
+        return result
 
     except VLMError as e:
         return jsonify({"error": str(e)}), 503
@@ -222,9 +315,6 @@ def identify():
 @app.route("/chat", methods=["POST"])
 def chat():
     """Follow-up question about current scene."""
-    import base64
-    global current_conversation
-
     data = request.get_json()
     if not data or "message" not in data:
         return jsonify({"error": "Message is required"}), 400
@@ -234,27 +324,29 @@ def chat():
         return jsonify({"error": "Message cannot be empty"}), 400
 
     # Check if we have a conversation context
-    if not current_conversation["history"]:
+    conversation_id = request.cookies.get(CONVERSATION_COOKIE)
+    with _conversations_lock:
+        conversation = _conversations.get(conversation_id)
+    if not conversation:
         return jsonify({
             "error": "No active conversation. Try identifying someone first!"
         }), 400
 
     try:
-        response, updated_history = chat_followup(
-            current_conversation["contact_sheet_b64"],
-            current_conversation["frame_b64"],
+        # Call the VLM without holding the lock; audio for browser playback
+        # is generated while the response streams
+        response, audio_b64 = _collect_with_audio(chat_followup_stream(
+            conversation["contact_sheet_b64"],
+            conversation["frame_b64"],
             message,
-            current_conversation["history"]
-        )
+            conversation["history"]
+        ))
+        updated_history = extend_conversation(conversation["history"], message, response)
 
-        # Update conversation history
-        current_conversation["history"] = updated_history
-
-        # Generate audio for browser playback
-        audio_data = tts.synthesize(response)
-        audio_b64 = None
-        if audio_data:
-            audio_b64 = base64.b64encode(audio_data).decode("utf-8")
+        # Update conversation history, unless a new identify replaced it meanwhile
+        with _conversations_lock:
+            if _conversations.get(conversation_id) is conversation:
+                _store_conversation(conversation_id, {**conversation, "history": updated_history})
 
         return jsonify({"response": response, "audio": audio_b64})
 
@@ -265,12 +357,8 @@ def chat():
 @app.route("/chat/reset", methods=["POST"])
 def reset_chat():
     """Reset the current conversation."""
-    global current_conversation
-    current_conversation = {
-        "contact_sheet_b64": None,
-        "frame_b64": None,
-        "history": []
-    }
+    with _conversations_lock:
+        _conversations.pop(request.cookies.get(CONVERSATION_COOKIE), None)
     return jsonify({"success": True})
 
 
@@ -322,6 +410,7 @@ def cleanup():
     print("[App] Shutting down...")
     camera.stop()
     tts.stop()
+    close_vlm_session()
 
 
 if __name__ == "__main__":
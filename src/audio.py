@@ -1,22 +1,44 @@
 """Text-to-speech and audio playback for Who's That?"""
 
+import io
 import os
+import functools
+import hashlib
 import threading
+import traceback
 import queue
-import tempfile
-import time
+from collections import OrderedDict
 from pathlib import Path
 from typing import Optional
 
 from openai import OpenAI
 
-from config import AUDIO_DEVICE, TTS_VOICE, TTS_MODEL, APP_DIR
+from config import AUDIO_DEVICE, TTS_VOICE, TTS_MODEL, TTS_CACHE_DIR
 
 # Set audio output before importing pygame
 os.environ['SDL_AUDIODRIVER'] = 'alsa'
 os.environ['AUDIODEV'] = AUDIO_DEVICE
 
-import pygame
+
+@functools.lru_cache(maxsize=1)
+def _pygame():
+    """Import pygame on first use; only needed once the mixer is started."""
+    import pygame
+    return pygame
+
+
+# Mixer settings to try, lowest latency first. OpenAI TTS returns 24 kHz mono,
+# so matching it skips SDL's resampling pass. {} is pygame's default.
+MIXER_SETTINGS = [
+    {"frequency": 24000, "size": -16, "channels": 1, "buffer": 512},
+    {"frequency": 24000, "size": -16, "channels": 1, "buffer": 1024},
+    {},
+]
+
+# Number of synthesized clips kept in memory and on disk. The disk cache
+# evicts least recently used clips by mtime, which hits refresh.
+TTS_MEMORY_CACHE_SIZE = 64
+TTS_DISK_CACHE_SIZE = 512
 
 
 class TTSEngine:
@@ -28,7 +50,10 @@ class TTSEngine:
         self._thread: Optional[threading.Thread] = None
         self._openai_client: Optional[OpenAI] = None
         self._mixer_initialized = False
-        self._temp_dir = APP_DIR / "audio_temp"
+        self._cache_dir = TTS_CACHE_DIR
+        self._mem_cache: OrderedDict[str, bytes] = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._interrupt = threading.Event()
         self._volume = 1.0
 
     def start(self):
@@ -47,15 +72,22 @@ class TTSEngine:
         # Initialize pygame mixer
         try:
             print("[TTS] Initializing pygame mixer...")
-            pygame.mixer.init()
+            for i, settings in enumerate(MIXER_SETTINGS):
+                try:
+                    _pygame().mixer.init(**settings)
+                    break
+                except _pygame().error as e:
+                    if i == len(MIXER_SETTINGS) - 1:
+                        raise
+                    print(f"[TTS] Mixer settings {settings} failed ({e}), backing off")
             self._mixer_initialized = True
-            print(f"[TTS] Mixer initialized: {pygame.mixer.get_init()}")
+            print(f"[TTS] Mixer initialized: {_pygame().mixer.get_init()}")
         except Exception as e:
             print(f"[TTS] Failed to initialize mixer: {e}")
             self._mixer_initialized = False
 
-        # Create temp directory
-        self._temp_dir.mkdir(exist_ok=True)
+        # Create cache directory
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
 
         # Start playback thread
         self._running = True
@@ -65,11 +97,12 @@ class TTSEngine:
     def stop(self):
         """Stop the TTS engine."""
         self._running = False
+        self._interrupt.set()
         self._queue.put(None)  # Signal to stop
         if self._thread:
             self._thread.join(timeout=2)
         if self._mixer_initialized:
-            pygame.mixer.quit()
+            _pygame().mixer.quit()
 
     def speak(self, text: str, blocking: bool = False):
         """
@@ -91,7 +124,7 @@ class TTSEngine:
         """Set playback volume (0.0 to 1.0)."""
         self._volume = max(0.0, min(1.0, volume))
         if self._mixer_initialized:
-            pygame.mixer.music.set_volume(self._volume)
+            _pygame().mixer.music.set_volume(self._volume)
 
     def _playback_loop(self):
         """Background thread for processing TTS queue."""
@@ -104,16 +137,72 @@ class TTSEngine:
             except queue.Empty:
                 continue
 
+    def _cache_get(self, key: str) -> Optional[bytes]:
+        """Look up synthesized audio in the memory cache, then on disk."""
+        with self._cache_lock:
+            audio_data = self._mem_cache.get(key)
+            if audio_data is not None:
+                self._mem_cache.move_to_end(key)
+                return audio_data
+
+        path = self._cache_dir / f"{key}.mp3"
+        try:
+            audio_data = path.read_bytes()
+            path.touch()
+        except OSError:
+            return None
+        self._cache_put(key, audio_data, persist=False)
+        return audio_data
+
+    def _cache_put(self, key: str, audio_data: bytes, persist: bool = True):
+        """Store synthesized audio in the memory cache and optionally on disk."""
+        with self._cache_lock:
+            self._mem_cache[key] = audio_data
+            self._mem_cache.move_to_end(key)
+            while len(self._mem_cache) > TTS_MEMORY_CACHE_SIZE:
+                self._mem_cache.popitem(last=False)
+
+        if persist:
+            try:
+                (self._cache_dir / f"{key}.mp3").write_bytes(audio_data)
+                self._prune_disk_cache()
+            except OSError as e:
+                print(f"[TTS] Could not write cache file: {e}")
+
+    def _prune_disk_cache(self):
+        """Delete the least recently used clips beyond TTS_DISK_CACHE_SIZE."""
+        with os.scandir(self._cache_dir) as it:
+            entries = [e for e in it if e.name.endswith(".mp3")]
+        if len(entries) <= TTS_DISK_CACHE_SIZE:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime_ns)
+        for entry in entries[:len(entries) - TTS_DISK_CACHE_SIZE]:
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
+
     def synthesize(self, text: str) -> Optional[bytes]:
         """
         Synthesize speech and return MP3 bytes.
 
+        Repeated phrases are served from a memory/disk cache keyed by
+        model, voice and text.
+
         Args:
             text: Text to synthesize
 
         Returns:
             MP3 audio bytes or None if synthesis failed
         """
+        key = hashlib.blake2b(
+            f"{TTS_MODEL}|{TTS_VOICE}|{text}".encode("utf-8"), digest_size=16
+        ).hexdigest()
+        audio_data = self._cache_get(key)
+        if audio_data is not None:
+            print(f"[TTS] Cache hit: {text[:50]}...")
+            return audio_data
+
         if not self._openai_client:
             print(f"[TTS] No OpenAI client, cannot synthesize: {text[:50]}...")
             return None
@@ -126,11 +215,11 @@ class TTSEngine:
                 input=text
             )
             print("[TTS] Synthesis complete")
+            self._cache_put(key, response.content)
             return response.content
 
         except Exception as e:
             print(f"[TTS] Error: {e}")
-            import traceback
             traceback.print_exc()
             return None
 
@@ -145,42 +234,36 @@ class TTSEngine:
             return
 
         try:
-            # Write to temp file for pygame
-            temp_file = self._temp_dir / f"tts_{int(time.time() * 1000)}.mp3"
-            temp_file.write_bytes(audio_data)
-
-            # Play the audio
-            pygame.mixer.music.set_volume(self._volume)
-            pygame.mixer.music.load(str(temp_file))
-            pygame.mixer.music.play()
-
-            # Wait for playback to complete
-            while pygame.mixer.music.get_busy():
-                time.sleep(0.1)
-
-            # Clean up temp file
-            try:
-                temp_file.unlink()
-            except OSError:
-                pass
+            # Play the audio straight from memory
+            self._interrupt.clear()
+            music = _pygame().mixer.music
+            music.set_volume(self._volume)
+            music.load(io.BytesIO(audio_data), "mp3")
+            music.play()
+
+            # Wait for playback to complete; stop_playback() wakes us at once
+            while music.get_busy():
+                if self._interrupt.wait(0.25):
+                    music.stop()
+                    break
 
             print("[TTS] Playback complete")
 
         except Exception as e:
             print(f"[TTS] Error: {e}")
-            import traceback
             traceback.print_exc()
 
     def is_playing(self) -> bool:
         """Check if audio is currently playing."""
         if self._mixer_initialized:
-            return pygame.mixer.music.get_busy()
+            return _pygame().mixer.music.get_busy()
         return False
 
     def stop_playback(self):
         """Stop current playback."""
+        self._interrupt.set()
         if self._mixer_initialized:
-            pygame.mixer.music.stop()
+            _pygame().mixer.music.stop()
 
 
 # Global TTS instance
@@ -1,11 +1,15 @@
 """Camera capture thread and MJPEG streaming for Who's That?"""
 
 import cv2
+import requests
 import threading
 import time
-import base64
+import pybase64
 import os
-from typing import Optional, Generator
+import re
+import shutil
+import subprocess
+from typing import Optional, Generator, Tuple, Union
 import numpy as np
 
 # Suppress FFmpeg/libav warnings (SEI truncation spam from H.264 streams)
@@ -14,9 +18,144 @@ os.environ["OPENCV_LOG_LEVEL"] = "SILENT"
 
 
 from config import (
-    CAMERA_IP, CAMERA_USER, CAMERA_PASSWORD,
-    CAMERA_URL_OVERRIDE, RTSP_PATHS, HTTP_PATHS
+    CAMERA_IP, CAMERA_USER, CAMERA_PASSWORD, CAMERA_URL_OVERRIDE,
+    CAMERA_HW_DECODER, RTSP_PATHS, HTTP_PATHS, HW_H264_DECODERS
 )
+from jpeg import encode_jpeg_into, decode_jpeg
+
+# Quality used when the caller doesn't ask for a specific one
+DEFAULT_JPEG_QUALITY = 85
+
+# Frame rate assumed when the camera doesn't report a plausible one
+DEFAULT_FPS = 30.0
+MAX_FPS = 120.0
+
+# Static part of each MJPEG multipart chunk header
+MJPEG_PART_PREFIX = b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+
+# Incoming MJPEG parts: size header, and the most unparsed data kept while
+# looking for a complete frame
+MJPEG_CONTENT_LENGTH = re.compile(rb"Content-Length:\s*(\d+)", re.IGNORECASE)
+MJPEG_MAX_BUFFER = 4 * 1024 * 1024
+
+# "No Signal" placeholder layout (static, so measured once)
+NO_SIGNAL_SIZE = (640, 480)
+NO_SIGNAL_TEXT = "No Signal"
+NO_SIGNAL_FONT = cv2.FONT_HERSHEY_SIMPLEX
+NO_SIGNAL_FONT_SCALE = 1.5
+NO_SIGNAL_THICKNESS = 3
+NO_SIGNAL_TEXT_SIZE = cv2.getTextSize(
+    NO_SIGNAL_TEXT, NO_SIGNAL_FONT, NO_SIGNAL_FONT_SCALE, NO_SIGNAL_THICKNESS
+)[0]
+
+
+def _detect_hw_decoder() -> Optional[str]:
+    """Find a hardware H.264 decoder usable through OpenCV's GStreamer backend."""
+    if CAMERA_HW_DECODER.lower() in ("", "none", "off"):
+        return None
+    if not re.search(r"GStreamer:\s*YES", cv2.getBuildInformation()):
+        return None
+    if CAMERA_HW_DECODER.lower() != "auto":
+        return CAMERA_HW_DECODER
+
+    gst_inspect = shutil.which("gst-inspect-1.0")
+    if not gst_inspect:
+        return None
+    for decoder in HW_H264_DECODERS:
+        result = subprocess.run([gst_inspect, "--exists", decoder], capture_output=True)
+        if result.returncode == 0:
+            return decoder
+    return None
+
+
+def _gst_rtsp_pipeline(url: str, decoder: str) -> str:
+    """Build a GStreamer pipeline that decodes an RTSP H.264 stream to BGR."""
+    return (
+        f'rtspsrc location="{url}" latency=0 protocols=tcp ! rtph264depay ! h264parse ! '
+        f"{decoder} ! videoconvert ! video/x-raw,format=BGR ! "
+        "appsink drop=true max-buffers=1 sync=false"
+    )
+
+
+class MjpegCapture:
+    """
+    HTTP MJPEG reader with the subset of the cv2.VideoCapture API we use.
+
+    Unlike OpenCV it keeps the camera's own JPEG bytes for the last frame
+    (last_jpeg), so they can be served without re-encoding.
+    """
+
+    def __init__(self, url: str, timeout: float = 5):
+        self.last_jpeg: Optional[bytes] = None
+        self._buf = bytearray()
+        try:
+            self._resp = requests.get(url, stream=True, timeout=timeout)
+            self._resp.raise_for_status()
+            self._chunks = self._resp.iter_content(chunk_size=16384)
+        except requests.RequestException:
+            self._resp = None
+
+    def isOpened(self) -> bool:
+        return self._resp is not None
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        jpeg = self._next_jpeg()
+        frame = decode_jpeg(jpeg) if jpeg is not None else None
+        if frame is None:
+            return False, None
+        self.last_jpeg = jpeg
+        return True, frame
+
+    def _next_jpeg(self) -> Optional[bytes]:
+        """Read from the multipart stream until a complete JPEG can be cut out."""
+        while True:
+            jpeg = self._cut_jpeg()
+            if jpeg is not None:
+                return jpeg
+            if len(self._buf) > MJPEG_MAX_BUFFER:
+                # No complete frame within the limit; resync on the last SOI
+                start = self._buf.rfind(b"\xff\xd8", 1)
+                del self._buf[:start if start > 0 else len(self._buf)]
+            try:
+                self._buf += next(self._chunks)
+            except (StopIteration, requests.RequestException):
+                return None
+
+    def _cut_jpeg(self) -> Optional[bytes]:
+        """
+        Remove and return the first complete JPEG in the buffer, if any.
+
+        The part's Content-Length is used when the camera sends one. Without
+        it the JPEG runs from SOI to the first EOI, which is cut short when
+        the image embeds an EXIF thumbnail.
+        """
+        start = self._buf.find(b"\xff\xd8")
+        if start < 0:
+            return None
+        header = MJPEG_CONTENT_LENGTH.search(self._buf, 0, start)
+        if header is not None:
+            end = start + int(header.group(1))
+            if len(self._buf) < end:
+                return None
+        else:
+            end = self._buf.find(b"\xff\xd9", start + 2)
+            if end < 0:
+                return None
+            end += 2
+        jpeg = bytes(self._buf[start:end])
+        del self._buf[:end]
+        return jpeg
+
+    def get(self, prop: int) -> float:
+        return 0.0  # Properties (including FPS) are unknown
+
+    def set(self, prop: int, value: float) -> bool:
+        return False
+
+    def release(self):
+        if self._resp is not None:
+            self._resp.close()
+            self._resp = None
 
 
 class CameraThread:
@@ -25,18 +164,32 @@ class CameraThread:
     def __init__(self):
         self._frame: Optional[np.ndarray] = None
         self._frame_lock = threading.Lock()
+        self._frame_ready = threading.Condition(self._frame_lock)
+        self._frame_seq = 0
         self._running = False
         self._thread: Optional[threading.Thread] = None
-        self._cam: Optional[cv2.VideoCapture] = None
+        self._cam: Optional[Union[cv2.VideoCapture, MjpegCapture]] = None
         self._connected = False
         self._last_error: Optional[str] = None
         self._reconnect_interval = 5  # seconds
+        self._hw_decoder: Optional[str] = None
+        self._frame_interval = 1.0 / DEFAULT_FPS
+        self._next_tick = 0.0
+        self._jpeg_buf: Optional[bytearray] = None
+        self._jpeg_lock = threading.Lock()
+        # (seq, quality, jpeg); quality is None for the camera's own JPEG
+        self._latest_jpeg: Optional[tuple[int, Optional[int], bytes]] = None
+        self._no_signal_cache: Optional[tuple[str, bytes]] = None
 
     def start(self):
         """Start the camera capture thread."""
         if self._running:
             return
 
+        self._hw_decoder = _detect_hw_decoder()
+        if self._hw_decoder:
+            print(f"[Camera] Using hardware H.264 decoder: {self._hw_decoder}")
+
         self._running = True
         self._thread = threading.Thread(target=self._capture_loop, daemon=True)
         self._thread.start()
@@ -50,53 +203,70 @@ class CameraThread:
             self._cam.release()
             self._cam = None
 
+    def _on_connected(self):
+        """Configure a freshly opened capture and mark the camera connected."""
+        self._cam.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        # Pace reads to the camera's own frame rate
+        fps = self._cam.get(cv2.CAP_PROP_FPS)
+        if not 1.0 <= fps <= MAX_FPS:
+            fps = DEFAULT_FPS
+        self._frame_interval = 1.0 / fps
+        self._next_tick = time.monotonic()
+
+        self._connected = True
+        self._last_error = None
+
+    def _open(self, cam: Union[cv2.VideoCapture, MjpegCapture]) -> bool:
+        """Adopt a capture source if it delivers a frame."""
+        self._cam = cam
+        if self._cam.isOpened():
+            ret, _ = self._cam.read()
+            if ret:
+                self._on_connected()
+                return True
+        self._cam.release()
+        return False
+
     def _connect(self) -> bool:
         """Attempt to connect to the camera."""
         # Use override URL if provided
         if CAMERA_URL_OVERRIDE:
             print(f"[Camera] Using override URL: {CAMERA_URL_OVERRIDE}")
-            self._cam = cv2.VideoCapture(CAMERA_URL_OVERRIDE)
-            if self._cam.isOpened():
-                ret, _ = self._cam.read()
-                if ret:
-                    self._cam.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-                    self._connected = True
-                    self._last_error = None
-                    print("[Camera] Connected via override URL")
-                    return True
-            self._cam.release()
+            if self._open(cv2.VideoCapture(CAMERA_URL_OVERRIDE)):
+                print("[Camera] Connected via override URL")
+                return True
 
-        # Try RTSP streams
+        # Try RTSP streams, every path hardware-decoded first when available,
+        # so a later path that works with the hardware decoder wins over an
+        # earlier one that only works in software
         print(f"[Camera] Connecting to camera at {CAMERA_IP}...")
-        for path in RTSP_PATHS:
-            url = f"rtsp://{CAMERA_USER}:{CAMERA_PASSWORD}@{CAMERA_IP}:554{path}"
-            print(f"[Camera]   Trying RTSP: {path}")
-            self._cam = cv2.VideoCapture(url)
-            if self._cam.isOpened():
-                ret, _ = self._cam.read()
-                if ret:
-                    self._cam.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-                    self._connected = True
-                    self._last_error = None
-                    print(f"[Camera] Connected via RTSP: {path}")
+        rtsp_urls = [
+            (path, f"rtsp://{CAMERA_USER}:{CAMERA_PASSWORD}@{CAMERA_IP}:554{path}")
+            for path in RTSP_PATHS
+        ]
+        if self._hw_decoder:
+            for path, url in rtsp_urls:
+                print(f"[Camera]   Trying RTSP: {path} ({self._hw_decoder})")
+                if self._open(cv2.VideoCapture(
+                    _gst_rtsp_pipeline(url, self._hw_decoder), cv2.CAP_GSTREAMER
+                )):
+                    print(f"[Camera] Connected via RTSP: {path} ({self._hw_decoder})")
                     return True
-            self._cam.release()
+        for path, url in rtsp_urls:
+            print(f"[Camera]   Trying RTSP: {path}")
+            if self._open(cv2.VideoCapture(url)):
+                print(f"[Camera] Connected via RTSP: {path}")
+                return True
 
-        # Fallback to HTTP MJPEG
+        # Fallback to HTTP MJPEG (read directly so the camera's JPEGs can be reused)
         print("[Camera] RTSP failed, trying HTTP MJPEG...")
         for path in HTTP_PATHS:
             url = f"http://{CAMERA_USER}:{CAMERA_PASSWORD}@{CAMERA_IP}{path}"
             print(f"[Camera]   Trying HTTP: {path}")
-            self._cam = cv2.VideoCapture(url)
-            if self._cam.isOpened():
-                ret, _ = self._cam.read()
-                if ret:
-                    self._cam.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-                    self._connected = True
-                    self._last_error = None
-                    print(f"[Camera] Connected via HTTP: {path}")
-                    return True
-            self._cam.release()
+            if self._open(MjpegCapture(url)):
+                print(f"[Camera] Connected via HTTP: {path}")
+                return True
 
         self._connected = False
         self._last_error = f"Cannot connect to camera at {CAMERA_IP}"
@@ -117,6 +287,14 @@ class CameraThread:
                     time.sleep(self._reconnect_interval)
                     continue
 
+            # Wait for the next frame slot; don't try to catch up after a stall
+            now = time.monotonic()
+            if self._next_tick > now:
+                time.sleep(self._next_tick - now)
+                self._next_tick += self._frame_interval
+            else:
+                self._next_tick = now + self._frame_interval
+
             # Read frame
             ret, frame = self._cam.read()
             if not ret:
@@ -127,72 +305,108 @@ class CameraThread:
                 time.sleep(1)
                 continue
 
-            # Store frame thread-safely
-            with self._frame_lock:
-                self._frame = frame.copy()
+            # Store frame thread-safely. read() returns a fresh array each
+            # call, so swapping the reference is enough - no copy needed.
+            with self._frame_ready:
+                self._frame = frame
+                self._frame_seq += 1
+                seq = self._frame_seq
+                self._frame_ready.notify_all()
 
-            # Small delay to prevent CPU spinning
-            time.sleep(0.033)  # ~30fps max
+            # MJPEG sources already give us this frame as JPEG
+            if isinstance(self._cam, MjpegCapture):
+                with self._jpeg_lock:
+                    self._latest_jpeg = (seq, None, self._cam.last_jpeg)
 
     def get_frame(self) -> Optional[np.ndarray]:
-        """Get the latest frame (thread-safe)."""
+        """
+        Get the latest frame (thread-safe).
+
+        The returned array is shared with other readers and must not be
+        modified in place; copy it first if you need to draw on it.
+        """
         with self._frame_lock:
-            if self._frame is not None:
-                return self._frame.copy()
-            return None
+            return self._frame
+
+    def get_frame_jpeg(self, quality: Optional[int] = None) -> Optional[bytes]:
+        """
+        Get the latest frame as JPEG bytes (encoded once per captured frame).
 
-    def get_frame_jpeg(self, quality: int = 85) -> Optional[bytes]:
-        """Get the latest frame as JPEG bytes."""
-        frame = self.get_frame()
+        Args:
+            quality: JPEG quality; None accepts the camera's own JPEG when the
+                source provides one, else encodes at the default quality
+        """
+        with self._frame_lock:
+            frame, seq = self._frame, self._frame_seq
         if frame is None:
             return None
-        _, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
-        return buf.tobytes()
 
-    def get_frame_base64(self, quality: int = 85) -> Optional[str]:
+        # Encode into a reusable buffer; MJPEG clients and snapshots asking
+        # for the same frame share the result
+        with self._jpeg_lock:
+            cached = self._latest_jpeg
+            if cached is not None and cached[0] == seq and (
+                cached[1] == quality or (quality is None and cached[1] == DEFAULT_JPEG_QUALITY)
+            ):
+                return cached[2]
+            quality = quality or DEFAULT_JPEG_QUALITY
+            jpeg, self._jpeg_buf = encode_jpeg_into(frame, self._jpeg_buf, quality)
+            self._latest_jpeg = (seq, quality, jpeg)
+        return jpeg
+
+    def get_frame_base64(self, quality: Optional[int] = None) -> Optional[str]:
         """Get the latest frame as base64-encoded JPEG."""
         jpeg = self.get_frame_jpeg(quality)
         if jpeg is None:
             return None
-        return base64.b64encode(jpeg).decode("utf-8")
+        return pybase64.b64encode_as_string(jpeg)
 
     def generate_mjpeg(self) -> Generator[bytes, None, None]:
         """Generate MJPEG stream for Flask response."""
+        last_seq = -1
         while self._running:
+            # Wait for a new frame; time out so the placeholder keeps flowing
+            with self._frame_ready:
+                self._frame_ready.wait_for(lambda: self._frame_seq != last_seq, timeout=1.0)
+                last_seq = self._frame_seq
+
             jpeg = self.get_frame_jpeg()
             if jpeg is None:
                 # Send a placeholder frame when no camera
                 jpeg = self._get_no_signal_frame()
 
-            yield (
-                b"--frame\r\n"
-                b"Content-Type: image/jpeg\r\n\r\n" + jpeg + b"\r\n"
-            )
-            time.sleep(0.033)  # ~30fps
+            # One bytes object per part so the server issues a single write
+            yield b"".join((
+                MJPEG_PART_PREFIX, str(len(jpeg)).encode(), b"\r\n\r\n", jpeg, b"\r\n"
+            ))
 
     def _get_no_signal_frame(self) -> bytes:
-        """Generate a 'no signal' placeholder frame."""
-        img = np.zeros((480, 640, 3), dtype=np.uint8)
+        """Get the 'no signal' placeholder frame, re-rendered only when the error changes."""
+        error = self._last_error or ""
+        cached = self._no_signal_cache
+        if cached is not None and cached[0] == error:
+            return cached[1]
+
+        width, height = NO_SIGNAL_SIZE
+        img = np.zeros((height, width, 3), dtype=np.uint8)
         img[:] = (40, 40, 40)  # Dark gray background
 
         # Add "No Signal" text
-        text = "No Signal"
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        font_scale = 1.5
-        thickness = 3
-        text_size = cv2.getTextSize(text, font, font_scale, thickness)[0]
-        x = (640 - text_size[0]) // 2
-        y = (480 + text_size[1]) // 2
-        cv2.putText(img, text, (x, y), font, font_scale, (100, 100, 100), thickness)
-
-        if self._last_error:
+        x = (width - NO_SIGNAL_TEXT_SIZE[0]) // 2
+        y = (height + NO_SIGNAL_TEXT_SIZE[1]) // 2
+        cv2.putText(img, NO_SIGNAL_TEXT, (x, y), NO_SIGNAL_FONT, NO_SIGNAL_FONT_SCALE,
+                    (100, 100, 100), NO_SIGNAL_THICKNESS)
+
+        if error:
             err_font_scale = 0.5
-            err_text_size = cv2.getTextSize(self._last_error, font, err_font_scale, 1)[0]
-            err_x = (640 - err_text_size[0]) // 2
-            cv2.putText(img, self._last_error, (err_x, y + 40), font, err_font_scale, (80, 80, 80), 1)
+            err_text_size = cv2.getTextSize(error, NO_SIGNAL_FONT, err_font_scale, 1)[0]
+            err_x = (width - err_text_size[0]) // 2
+            cv2.putText(img, error, (err_x, y + 40), NO_SIGNAL_FONT, err_font_scale, (80, 80, 80), 1)
 
         _, buf = cv2.imencode(".jpg", img)
-        return buf.tobytes()
+        jpeg = buf.tobytes()
+        self._no_signal_cache = (error, jpeg)
+        return jpeg
 
     @property
     def is_connected(self) -> bool:
@@ -10,22 +10,38 @@ load_dotenv()
 APP_DIR = Path(__file__).parent
 PHOTOS_DIR = Path(os.getenv("PHOTOS_DIR", Path.home() / "photos"))
 CONTACT_SHEET_PATH = PHOTOS_DIR / ".contact_sheet.jpg"
+THUMBNAIL_CACHE_DIR = PHOTOS_DIR / ".thumbs"
+TTS_CACHE_DIR = PHOTOS_DIR / ".tts_cache"
 
 # Camera settings
 CAMERA_IP = os.getenv("CAMERA_IP", "192.168.68.55")
 CAMERA_USER = os.getenv("CAMERA_USER", "FeederGuard")
 CAMERA_PASSWORD = os.getenv("CAMERA_PASSWORD", "")
 CAMERA_URL_OVERRIDE = os.getenv("CAMERA_URL_OVERRIDE", "")
+# GStreamer H.264 decoder for RTSP: "auto" to detect, "none" to use FFmpeg
+CAMERA_HW_DECODER = os.getenv("CAMERA_HW_DECODER", "auto")
 
 # RTSP paths to try
 RTSP_PATHS = ["/stream1", "/stream2", "/live", "/h264", "/cam/realmonitor", "/"]
 # HTTP MJPEG paths to try
 HTTP_PATHS = ["/video", "/mjpeg", "/stream", "/cam.mjpg", "/snapshot.jpg"]
+# Hardware H.264 decoders to probe: Pi V4L2 M2M, NVIDIA NVDEC, VA-API
+HW_H264_DECODERS = ["v4l2h264dec", "nvh264dec", "vaapih264dec"]
 
 # VLM settings
 VLM_URL = os.getenv("VLM_URL", "http://192.168.68.76:6000/v1/chat/completions")
 VLM_MODEL = os.getenv("VLM_MODEL", "Qwen/Qwen2.5-VL-7B-Instruct")
 VLM_TIMEOUT = int(os.getenv("VLM_TIMEOUT", "30"))
+# Mark the image prefix of chat conversations with cache_control (for APIs
+# that need an explicit prompt-cache breakpoint)
+VLM_CACHE_CONTROL = os.getenv("VLM_CACHE_CONTROL", "false").lower() == "true"
+# Gzip request bodies; only enable if the VLM server accepts Content-Encoding: gzip
+VLM_GZIP = os.getenv("VLM_GZIP", "false").lower() == "true"
+# Images are downscaled to this long side and re-encoded before sending
+VLM_IMAGE_MAX_SIDE = int(os.getenv("VLM_IMAGE_MAX_SIDE", "1024"))
+# The contact sheet gets its own, larger limit so the name labels stay legible
+VLM_SHEET_MAX_SIDE = int(os.getenv("VLM_SHEET_MAX_SIDE", "4096"))
+VLM_IMAGE_QUALITY = int(os.getenv("VLM_IMAGE_QUALITY", "82"))
 
 # Audio settings
 AUDIO_DEVICE = os.getenv("AUDIO_DEVICE", "hw:3,0")
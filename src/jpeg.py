@@ -0,0 +1,83 @@
+"""JPEG encoding and decoding for Who's That?
+
+Uses libjpeg-turbo through PyTurboJPEG when it is available and falls back
+to OpenCV otherwise.
+"""
+
+from typing import Optional, Tuple
+import cv2
+import numpy as np
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420
+    turbojpeg: Optional[TurboJPEG] = TurboJPEG()
+except (ImportError, OSError, RuntimeError) as e:
+    print(f"[JPEG] libjpeg-turbo unavailable, using OpenCV: {e}")
+    turbojpeg = None
+
+
+def encode_jpeg(frame: np.ndarray, quality: int = 85) -> bytes:
+    """Encode a BGR frame as JPEG bytes."""
+    if turbojpeg is not None:
+        return turbojpeg.encode(
+            frame, quality=quality, pixel_format=TJPF_BGR, jpeg_subsample=TJSAMP_420
+        )
+    _, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buf.tobytes()
+
+
+def encode_jpeg_into(
+    frame: np.ndarray,
+    dst: Optional[bytearray],
+    quality: int = 85
+) -> Tuple[bytes, Optional[bytearray]]:
+    """
+    Encode a BGR frame as JPEG, reusing a destination buffer between calls.
+
+    Args:
+        frame: OpenCV frame (BGR numpy array)
+        dst: Buffer from a previous call, or None
+        quality: JPEG quality
+
+    Returns:
+        Tuple of (JPEG bytes, buffer to pass to the next call)
+    """
+    if turbojpeg is None:
+        return encode_jpeg(frame, quality), None
+
+    needed = turbojpeg.buffer_size(frame, TJSAMP_420)
+    if dst is None or len(dst) < needed:
+        dst = bytearray(needed)
+    _, nbytes = turbojpeg.encode(
+        frame, quality=quality, pixel_format=TJPF_BGR,
+        jpeg_subsample=TJSAMP_420, dst=dst
+    )
+    return bytes(memoryview(dst)[:nbytes]), dst
+
+
+def decode_jpeg(data: bytes, dst: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+    """
+    Decode JPEG bytes to a BGR frame.
+
+    Both backends release the GIL while decoding (ctypes foreign call or
+    OpenCV's binding), so other Flask threads keep running meanwhile.
+
+    Args:
+        data: JPEG bytes
+        dst: Array to decode into; reused when its shape matches the image
+
+    Returns:
+        BGR numpy array, or None if the data could not be decoded
+    """
+    if turbojpeg is None:
+        # frombuffer is a zero-copy view; imdecode only reads its input
+        return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    try:
+        width, height, _, _ = turbojpeg.decode_header(data)
+        if dst is None or dst.shape != (height, width, 3):
+            dst = np.empty((height, width, 3), dtype=np.uint8)
+        turbojpeg.decode(data, pixel_format=TJPF_BGR, dst=dst)
+        return dst
+    except OSError:
+        return None
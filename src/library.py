@@ -1,15 +1,19 @@
 """Photo library management and contact sheet generation for Who's That?"""
 
-import base64
+import io
+import os
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import cv2
 import numpy as np
+import pybase64
 from PIL import Image, ImageDraw, ImageFont
 
 from config import (
-    PHOTOS_DIR, CONTACT_SHEET_PATH,
+    PHOTOS_DIR, CONTACT_SHEET_PATH, THUMBNAIL_CACHE_DIR,
     THUMBNAIL_SIZE, CONTACT_SHEET_MAX_WIDTH, LABEL_FONT_SIZE
 )
 
@@ -20,7 +24,20 @@ class PhotoLibrary:
     def __init__(self):
         self._photos_dir = PHOTOS_DIR
         self._contact_sheet_path = CONTACT_SHEET_PATH
-        self._library_hash: Optional[str] = None
+        self._thumbs_dir = THUMBNAIL_CACHE_DIR
+        self._sheet: Optional[Image.Image] = None
+        self._sheet_cells: List[tuple] = []
+        self._sheet_bytes: Optional[bytes] = None
+        self._font: Optional[ImageFont.ImageFont] = None
+        self._label_cache: Dict[str, Tuple[Image.Image, int]] = {}
+        # Bumped on every library change; the sheet records the version it shows
+        self._library_version: int = 0
+        self._sheet_version: int = -1
+        # (photos dir mtime_ns, subjects) from the last directory walk
+        self._listing_cache: Optional[Tuple[int, List[Dict]]] = None
+        # Flask serves requests on several threads; guards the caches and the
+        # sheet. Reentrant because mutations regenerate the sheet while held.
+        self._lock = threading.RLock()
 
     def _ensure_dirs(self):
         """Ensure the photos directory exists."""
@@ -34,15 +51,19 @@ class PhotoLibrary:
         normalized = "".join(c for c in normalized if c.isalnum() or c == "_")
         return self._photos_dir / normalized
 
-    def _compute_library_hash(self) -> str:
-        """Compute a hash of the library state for cache invalidation."""
-        self._ensure_dirs()
-        subjects = []
-        for subject_dir in sorted(self._photos_dir.iterdir()):
-            if subject_dir.is_dir() and not subject_dir.name.startswith("."):
-                photos = sorted(subject_dir.glob("*.jpg"))
-                subjects.append(f"{subject_dir.name}:{len(photos)}")
-        return "|".join(subjects)
+    def _scan_subjects(self) -> List[os.DirEntry]:
+        """List subject directories, sorted by name."""
+        # scandir reports entry types without a stat() per entry
+        with os.scandir(self._photos_dir) as it:
+            return sorted(
+                (e for e in it if e.is_dir(follow_symlinks=False) and not e.name.startswith(".")),
+                key=lambda e: e.name
+            )
+
+    def _scan_photos(self, subject_dir) -> List[str]:
+        """List the photo filenames in a subject directory, sorted."""
+        with os.scandir(subject_dir) as it:
+            return sorted(e.name for e in it if e.name.endswith(".jpg"))
 
     def enroll(self, name: str, frame: np.ndarray) -> Dict:
         """
@@ -55,21 +76,23 @@ class PhotoLibrary:
         Returns:
             Dict with enrollment result
         """
-        self._ensure_dirs()
-        subject_dir = self._get_subject_dir(name)
-        subject_dir.mkdir(exist_ok=True)
-
-        # Find next photo number
-        existing = list(subject_dir.glob("*.jpg"))
-        next_num = len(existing) + 1
-        photo_path = subject_dir / f"{next_num:03d}.jpg"
-
-        # Save the full-resolution frame
-        cv2.imwrite(str(photo_path), frame)
-
-        # Invalidate contact sheet cache
-        self._library_hash = None
-        self._regenerate_contact_sheet()
+        with self._lock:
+            self._ensure_dirs()
+            subject_dir = self._get_subject_dir(name)
+            subject_dir.mkdir(exist_ok=True)
+
+            # Find next photo number
+            existing = self._scan_photos(subject_dir)
+            next_num = len(existing) + 1
+            photo_path = subject_dir / f"{next_num:03d}.jpg"
+
+            # Save the full-resolution frame
+            cv2.imwrite(str(photo_path), frame)
+
+            # Invalidate contact sheet cache
+            self._library_version += 1
+            self._listing_cache = None
+            self._regenerate_contact_sheet()
 
         return {
             "success": True,
@@ -83,24 +106,39 @@ class PhotoLibrary:
         """
         List all enrolled subjects.
 
+        The listing is cached and reused while the photos directory's mtime
+        is unchanged; methods that modify the library drop the cache.
+
         Returns:
-            List of subject info dicts
+            List of subject info dicts (copies; changing them doesn't affect
+            the cache)
         """
-        self._ensure_dirs()
-        subjects = []
-
-        for subject_dir in sorted(self._photos_dir.iterdir()):
-            if subject_dir.is_dir() and not subject_dir.name.startswith("."):
-                photos = sorted(subject_dir.glob("*.jpg"))
-                if photos:
-                    subjects.append({
-                        "name": subject_dir.name,
-                        "display_name": subject_dir.name.replace("_", " ").title(),
-                        "photo_count": len(photos),
-                        "photos": [p.name for p in photos]
-                    })
-
-        return subjects
+        return [dict(s, photos=list(s["photos"])) for s in self._subjects()]
+
+    def _subjects(self) -> List[Dict]:
+        """The cached listing behind list_subjects; callers must not modify it."""
+        with self._lock:
+            self._ensure_dirs()
+            mtime = self._photos_dir.stat().st_mtime_ns
+            if self._listing_cache is None or self._listing_cache[0] != mtime:
+                subjects = []
+
+                for subject_dir in self._scan_subjects():
+                    photos = self._scan_photos(subject_dir.path)
+                    if photos:
+                        subjects.append({
+                            "name": subject_dir.name,
+                            "display_name": subject_dir.name.replace("_", " ").title(),
+                            "photo_count": len(photos),
+                            "photos": photos
+                        })
+
+                # Picks up changes made to photos/ outside this class
+                if self._listing_cache is not None and self._listing_cache[1] != subjects:
+                    self._library_version += 1
+                self._listing_cache = (mtime, subjects)
+
+            return self._listing_cache[1]
 
     def get_subject_thumbnail(self, name: str, size: int = 150) -> Optional[bytes]:
         """
@@ -111,33 +149,26 @@ class PhotoLibrary:
             size: Thumbnail size in pixels
 
         Returns:
-            JPEG bytes or None if not found
+            JPEG bytes or None if not found (or size is not positive)
         """
         subject_dir = self._photos_dir / name
-        if not subject_dir.exists():
+        if size < 1 or not subject_dir.exists():
             return None
 
-        photos = sorted(subject_dir.glob("*.jpg"))
+        photos = self._scan_photos(subject_dir)
         if not photos:
             return None
 
-        # Use first photo
-        img = cv2.imread(str(photos[0]))
-        if img is None:
+        # Decode at reduced DCT scale and crop/resize through PIL, the same
+        # path the contact sheet uses
+        try:
+            thumb = self._render_thumb(subject_dir / photos[0], size)
+        except OSError:
             return None
 
-        # Resize to square thumbnail
-        h, w = img.shape[:2]
-        min_dim = min(h, w)
-        # Center crop to square
-        start_x = (w - min_dim) // 2
-        start_y = (h - min_dim) // 2
-        cropped = img[start_y:start_y + min_dim, start_x:start_x + min_dim]
-        # Resize
-        thumb = cv2.resize(cropped, (size, size))
-
-        _, buf = cv2.imencode(".jpg", thumb, [cv2.IMWRITE_JPEG_QUALITY, 85])
-        return buf.tobytes()
+        buf = io.BytesIO()
+        thumb.save(buf, "JPEG", quality=85, optimize=True)
+        return buf.getvalue()
 
     def get_photo(self, name: str, photo_id: str) -> Optional[bytes]:
         """
@@ -171,9 +202,13 @@ class PhotoLibrary:
         if not subject_dir.exists():
             return {"success": False, "message": f"I don't know anyone named {name}"}
 
-        shutil.rmtree(subject_dir)
-        self._library_hash = None
-        self._regenerate_contact_sheet()
+        with self._lock:
+            shutil.rmtree(subject_dir)
+            for thumb in self._thumbs_dir.glob(f"{name}.*.jpg"):
+                thumb.unlink(missing_ok=True)
+            self._library_version += 1
+            self._listing_cache = None
+            self._regenerate_contact_sheet()
 
         return {
             "success": True,
@@ -195,37 +230,62 @@ class PhotoLibrary:
         if not photo_path.exists():
             return {"success": False, "message": "Photo not found"}
 
-        photo_path.unlink()
+        with self._lock:
+            photo_path.unlink()
 
-        # Check if subject has no more photos
-        subject_dir = self._photos_dir / name
-        remaining = list(subject_dir.glob("*.jpg"))
-        if not remaining:
-            subject_dir.rmdir()
+            # Check if subject has no more photos
+            subject_dir = self._photos_dir / name
+            remaining = self._scan_photos(subject_dir)
+            if not remaining:
+                subject_dir.rmdir()
 
-        self._library_hash = None
-        self._regenerate_contact_sheet()
+            self._library_version += 1
+            self._listing_cache = None
+            self._regenerate_contact_sheet()
 
         return {"success": True, "message": "Photo deleted"}
 
     def clear_all(self) -> Dict:
         """Delete all enrolled subjects."""
-        self._ensure_dirs()
-        count = 0
-        for subject_dir in self._photos_dir.iterdir():
-            if subject_dir.is_dir() and not subject_dir.name.startswith("."):
-                shutil.rmtree(subject_dir)
-                count += 1
-
-        self._library_hash = None
-        if self._contact_sheet_path.exists():
-            self._contact_sheet_path.unlink()
+        with self._lock:
+            self._ensure_dirs()
+            dirs = [e.path for e in self._scan_subjects()]
+            # Overlap the per-file unlink latency across subjects
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                list(pool.map(shutil.rmtree, dirs))
+            count = len(dirs)
+
+            self._library_version += 1
+            self._listing_cache = None
+            self._sheet = None
+            self._sheet_cells = []
+            self._sheet_bytes = None
+            shutil.rmtree(self._thumbs_dir, ignore_errors=True)
+            if self._contact_sheet_path.exists():
+                self._contact_sheet_path.unlink()
 
         return {
             "success": True,
             "message": f"Cleared {count} subjects from memory."
         }
 
+    def get_contact_sheet_jpeg(self) -> Optional[bytes]:
+        """
+        Get the contact sheet as JPEG bytes.
+
+        Returns:
+            JPEG bytes or None if library is empty
+        """
+        with self._lock:
+            # Refresh the listing so outside changes bump the version
+            self._subjects()
+
+            # Check if we need to regenerate
+            if self._sheet_bytes is None or self._sheet_version != self._library_version:
+                self._regenerate_contact_sheet()
+
+            return self._sheet_bytes
+
     def get_contact_sheet_base64(self) -> Optional[str]:
         """
         Get the contact sheet as base64-encoded JPEG.
@@ -233,29 +293,113 @@ class PhotoLibrary:
         Returns:
             Base64 string or None if library is empty
         """
-        current_hash = self._compute_library_hash()
-
-        # Check if we need to regenerate
-        if not self._contact_sheet_path.exists() or self._library_hash != current_hash:
-            self._regenerate_contact_sheet()
-            self._library_hash = current_hash
-
-        if not self._contact_sheet_path.exists():
+        jpeg = self.get_contact_sheet_jpeg()
+        if jpeg is None:
             return None
-
-        with open(self._contact_sheet_path, "rb") as f:
-            return base64.b64encode(f.read()).decode("utf-8")
+        return pybase64.b64encode_as_string(jpeg)
 
     def has_subjects(self) -> bool:
         """Check if there are any enrolled subjects."""
-        return bool(self.list_subjects())
+        return bool(self._subjects())
+
+    def _get_font(self) -> ImageFont.ImageFont:
+        """Get the label font, loading it on first use."""
+        if self._font is not None:
+            return self._font
+
+        # Try to load a nice font, fall back to default
+        try:
+            font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", LABEL_FONT_SIZE)
+        except OSError:
+            try:
+                font = ImageFont.truetype("/usr/share/fonts/TTF/DejaVuSans-Bold.ttf", LABEL_FONT_SIZE)
+            except OSError:
+                font = ImageFont.load_default()
+        self._font = font
+        return font
+
+    def _get_label(self, text: str, height: int, max_width: int) -> Tuple[Image.Image, int]:
+        """
+        Get a label rendered onto a transparent strip, rendering it on first use.
+
+        Args:
+            text: Label text
+            height: Strip height in pixels
+            max_width: Widest the strip may be; longer labels are clipped
+
+        Returns:
+            Tuple of (RGBA strip, strip width used for centering)
+        """
+        cached = self._label_cache.get(text)
+        if cached is not None:
+            return cached
+
+        font = self._get_font()
+        bbox = font.getbbox(text)
+        width = max(1, min(bbox[2] - bbox[0], max_width))
+        strip = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+        ImageDraw.Draw(strip).text((-bbox[0], 0), text, fill=(0, 0, 0, 255), font=font)
+        self._label_cache[text] = (strip, width)
+        return self._label_cache[text]
+
+    def _render_thumb(self, photo_path: Path, thumb_size: int) -> Image.Image:
+        """Render a square thumbnail of a photo."""
+        img = Image.open(photo_path)
+        # Let libjpeg decode at a reduced DCT scale (1/2, 1/4, 1/8)
+        # that still leaves the short side at least thumb_size
+        img.draft("RGB", (thumb_size, thumb_size))
+        # Center crop to square
+        w, h = img.size
+        min_dim = min(w, h)
+        left = (w - min_dim) // 2
+        top = (h - min_dim) // 2
+        img = img.crop((left, top, left + min_dim, top + min_dim))
+        return img.resize((thumb_size, thumb_size), Image.Resampling.LANCZOS)
+
+    def _load_thumb(self, name: str, photo: str, thumb_size: int) -> Image.Image:
+        """Get a subject's thumbnail from the disk cache, rendering it if stale."""
+        photo_path = self._photos_dir / name / photo
+        cache_path = self._thumbs_dir / f"{name}.{Path(photo).stem}.{thumb_size}.jpg"
+        try:
+            if cache_path.stat().st_mtime_ns >= photo_path.stat().st_mtime_ns:
+                img = Image.open(cache_path)
+                img.load()
+                return img
+        except OSError:
+            pass
+
+        img = self._render_thumb(photo_path, thumb_size)
+        try:
+            self._thumbs_dir.mkdir(exist_ok=True)
+            img.save(cache_path, "JPEG", quality=90)
+        except OSError as e:
+            print(f"[Library] Could not cache thumbnail: {e}")
+        return img
 
     def _regenerate_contact_sheet(self):
-        """Regenerate the contact sheet image."""
-        subjects = self.list_subjects()
+        """
+        Bring the contact sheet up to date with the library.
+
+        The sheet is kept in memory between calls. When the grid size is
+        unchanged only cells whose subject or first photo changed are
+        redrawn; otherwise the sheet is rebuilt from scratch.
+        """
+        with self._lock:
+            self._regenerate_contact_sheet_locked()
+
+    def _regenerate_contact_sheet_locked(self):
+        """Body of _regenerate_contact_sheet; the caller holds the lock."""
+        subjects = self._subjects()
+        # Recorded only once the sheet is written, so a failed render is
+        # retried on the next read
+        version = self._library_version
         if not subjects:
+            self._sheet = None
+            self._sheet_cells = []
+            self._sheet_bytes = None
             if self._contact_sheet_path.exists():
                 self._contact_sheet_path.unlink()
+            self._sheet_version = version
             return
 
         thumb_size = THUMBNAIL_SIZE
@@ -272,41 +416,58 @@ class PhotoLibrary:
         sheet_width = max_cols * (thumb_size + padding) + padding
         sheet_height = num_rows * (cell_height + padding) + padding
 
-        # Use PIL for better text rendering
-        sheet = Image.new("RGB", (sheet_width, sheet_height), (255, 255, 255))
+        # What each cell shows; a cell is redrawn when this changes
+        cells = [
+            (s["name"], s["photos"][0], s["display_name"],
+             (self._photos_dir / s["name"] / s["photos"][0]).stat().st_mtime_ns)
+            for s in subjects
+        ]
+
+        if self._sheet is not None and self._sheet.size == (sheet_width, sheet_height):
+            sheet = self._sheet
+            old_cells = self._sheet_cells
+        else:
+            # Use PIL for better text rendering
+            sheet = Image.new("RGB", (sheet_width, sheet_height), (255, 255, 255))
+            old_cells = []
+
+        changed = [i for i, cell in enumerate(cells) if i >= len(old_cells) or old_cells[i] != cell]
+        vacated = list(range(len(cells), len(old_cells)))
+        if not changed and not vacated and self._sheet_bytes is not None:
+            self._sheet_version = version
+            return
+
         draw = ImageDraw.Draw(sheet)
 
-        # Try to load a nice font, fall back to default
-        try:
-            font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", LABEL_FONT_SIZE)
-        except OSError:
-            try:
-                font = ImageFont.truetype("/usr/share/fonts/TTF/DejaVuSans-Bold.ttf", LABEL_FONT_SIZE)
-            except OSError:
-                font = ImageFont.load_default()
+        # Load or render thumbnails in parallel (libjpeg and resize
+        # release the GIL); drawing stays on this thread
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as pool:
+            thumbs = list(pool.map(
+                lambda i: self._load_thumb(cells[i][0], cells[i][1], thumb_size), changed
+            ))
 
-        for idx, subject in enumerate(subjects):
+        for idx in vacated + changed:
             row = idx // max_cols
             col = idx % max_cols
 
             x = padding + col * (thumb_size + padding)
             y = padding + row * (cell_height + padding)
 
-            # Load and resize the first photo
-            subject_dir = self._photos_dir / subject["name"]
-            photos = sorted(subject_dir.glob("*.jpg"))
-            if photos:
-                img = Image.open(photos[0])
-                # Center crop to square
-                w, h = img.size
-                min_dim = min(w, h)
-                left = (w - min_dim) // 2
-                top = (h - min_dim) // 2
-                img = img.crop((left, top, left + min_dim, top + min_dim))
-                img = img.resize((thumb_size, thumb_size), Image.Resampling.LANCZOS)
-
-                # Paste onto sheet
-                sheet.paste(img, (x, y))
+            # Blank the cell (including half the surrounding padding)
+            draw.rectangle(
+                [x - padding // 2, y, x + thumb_size + padding // 2, y + cell_height],
+                fill=(255, 255, 255)
+            )
+
+        for idx, thumb in zip(changed, thumbs):
+            row = idx // max_cols
+            col = idx % max_cols
+
+            x = padding + col * (thumb_size + padding)
+            y = padding + row * (cell_height + padding)
+
+            # Paste onto sheet
+            sheet.paste(thumb, (x, y))
 
             # Draw border
             draw.rectangle(
@@ -315,19 +476,22 @@ class PhotoLibrary:
                 width=2
             )
 
-            # Draw label
-            label = subject["display_name"]
-            # Get text bounding box
-            bbox = draw.textbbox((0, 0), label, font=font)
-            text_width = bbox[2] - bbox[0]
-            text_x = x + (thumb_size - text_width) // 2
+            # Paste the pre-rendered label, centered under the thumbnail and
+            # clipped to the blanked cell so it never spills into a neighbour
+            label, text_width = self._get_label(cells[idx][2], label_height - 5, thumb_size + padding)
+            text_x = x - padding // 2 + (thumb_size + padding - text_width) // 2
             text_y = y + thumb_size + 5
-
-            draw.text((text_x, text_y), label, fill=(0, 0, 0), font=font)
-
-        # Save the contact sheet
-        sheet.save(self._contact_sheet_path, "JPEG", quality=90)
-        print(f"[Library] Contact sheet regenerated with {len(subjects)} subjects")
+            sheet.paste(label, (text_x, text_y), label)
+
+        # Encode once in memory; the file is kept for other readers
+        buf = io.BytesIO()
+        sheet.save(buf, "JPEG", quality=90, optimize=True, progressive=True)
+        self._sheet = sheet
+        self._sheet_cells = cells
+        self._sheet_bytes = buf.getvalue()
+        self._sheet_version = version
+        self._contact_sheet_path.write_bytes(self._sheet_bytes)
+        print(f"[Library] Contact sheet updated: {len(changed)} of {len(subjects)} cells redrawn")
 
 
 # Global library instance
@@ -6,13 +6,20 @@ Captures a frame every couple of seconds and asks the model what it sees.
 
 import cv2
 import base64
+import io
+import orjson
+import queue
 import requests
+import threading
 import time
 import sys
 import os
 from openai import OpenAI
 import pygame
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from jpeg import encode_jpeg
 
 # Load environment variables and initialize audio
 load_dotenv()
@@ -48,6 +55,14 @@ openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 SGLANG_URL = "http://192.168.68.76:6000/v1/chat/completions"
 MODEL = "Qwen/Qwen2.5-VL-7B-Instruct"
 INTERVAL = 2  # seconds between checks
+MAX_IMAGE_SIDE = 768  # the VLM resizes internally; larger frames only cost bandwidth
+JPEG_QUALITY = 80
+MOTION_THRESHOLD = 3.0  # mean abs gray-level difference that counts as a change
+
+# Persistent session so model requests reuse one keep-alive connection
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=2, pool_maxsize=2))
+SESSION.headers["Connection"] = "keep-alive"
 
 # WiFi camera settings
 CAMERA_IP = "192.168.68.55"
@@ -75,35 +90,71 @@ Be concise but informative."""
 
 
 def encode_frame(frame):
-    _, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-    return base64.b64encode(buf).decode("utf-8")
+    h, w = frame.shape[:2]
+    scale = MAX_IMAGE_SIDE / max(h, w)
+    if scale < 1:
+        frame = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    # libjpeg-turbo via PyTurboJPEG (4:2:0 chroma), falling back to OpenCV
+    return base64.b64encode(encode_jpeg(frame, quality=JPEG_QUALITY)).decode("utf-8")
+
+
+def capture_frames(cam, frame_q, stop):
+    """
+    Read frames continuously, keeping only the newest one in frame_q.
+
+    Releases cam on exit; it must not be released while read() may be
+    running on this thread.
+    """
+    try:
+        while not stop.is_set():
+            ret, frame = cam.read()
+            if not ret:
+                print("Frame grab failed, retrying...")
+                time.sleep(1)
+                continue
+            # Drop the stale frame so the consumer always gets the latest
+            try:
+                frame_q.get_nowait()
+            except queue.Empty:
+                pass
+            frame_q.put(frame)
+    finally:
+        cam.release()
+
+
+def frame_signature(frame):
+    """Tiny grayscale copy of a frame for cheap change detection."""
+    small = cv2.resize(frame, (64, 36), interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
 
 
 def ask_model(b64_image, prompt=PROMPT, max_tokens=100):
-    resp = requests.post(
-        SGLANG_URL,
-        json={
-            "model": MODEL,
-            "max_tokens": max_tokens,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{b64_image}"
-                            },
+    payload = orjson.dumps({
+        "model": MODEL,
+        "max_tokens": max_tokens,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:image/jpeg;base64,{b64_image}"
                         },
-                        {"type": "text", "text": prompt},
-                    ],
-                }
-            ],
-        },
+                    },
+                    {"type": "text", "text": prompt},
+                ],
+            }
+        ],
+    })
+    resp = SESSION.post(
+        SGLANG_URL,
+        data=payload,
+        headers={"Content-Type": "application/json"},
         timeout=10,
     )
     resp.raise_for_status()
-    return resp.json()["choices"][0]["message"]["content"]
+    return orjson.loads(resp.content)["choices"][0]["message"]["content"]
 
 
 def describe_scene(b64_image):
@@ -120,10 +171,13 @@ def speak(text):
             voice="alloy",
             input=text
         ) as response:
-            print("[TTS] Got response, streaming to file...")
-            response.stream_to_file('response.mp3')
-        print("[TTS] File written, loading into pygame...")
-        pygame.mixer.music.load('response.mp3')
+            print("[TTS] Got response, streaming to memory...")
+            buf = io.BytesIO()
+            for chunk in response.iter_bytes():
+                buf.write(chunk)
+        buf.seek(0)
+        print("[TTS] Audio received, loading into pygame...")
+        pygame.mixer.music.load(buf, "mp3")
         print("[TTS] Playing audio...")
         pygame.mixer.music.play()
         while pygame.mixer.music.get_busy():
@@ -178,17 +232,31 @@ def main():
 
     print("Watching for squirrels... (Ctrl+C to stop)\n")
 
+    # Signature of the last frame sent to the model
+    prev_small = None
+
+    # Read frames in the background so decoding overlaps model requests
+    frame_q = queue.Queue(maxsize=1)
+    stop = threading.Event()
+    capture_thread = threading.Thread(target=capture_frames, args=(cam, frame_q, stop), daemon=True)
+    capture_thread.start()
+
     try:
         while True:
-            ret, frame = cam.read()
-            if not ret:
-                print("Frame grab failed, retrying...")
-                time.sleep(1)
+            frame = frame_q.get()
+
+            # Skip the model when nothing has changed since the last check
+            small = frame_signature(frame)
+            if prev_small is not None and cv2.absdiff(small, prev_small).mean() < MOTION_THRESHOLD:
+                time.sleep(INTERVAL)
                 continue
 
             b64 = encode_frame(frame)
             try:
                 answer = ask_model(b64)
+                # Only a frame the model actually saw becomes the baseline,
+                # so a failed request is retried on the next frame
+                prev_small = small
                 timestamp = time.strftime("%H:%M:%S")
                 print(f"[{timestamp}] {answer}\n")
 
@@ -217,7 +285,9 @@ def main():
     except KeyboardInterrupt:
         print("\nStopped.")
     finally:
-        cam.release()
+        # The capture thread releases the camera once its current read returns
+        stop.set()
+        capture_thread.join(timeout=2)
 
 
 if __name__ == "__main__":
@@ -1,15 +1,185 @@
 """Vision Language Model client for Who's That?"""
 
+import io
 import os
+import asyncio
+import random
+import time
+import gzip
+import threading
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import httpx
+import orjson
+import pybase64
+import xxhash
 import requests
-from typing import Optional, List, Dict, Any
+from requests.adapters import HTTPAdapter
+from typing import Optional, List, Dict, Any, Iterable, Iterator, Tuple, Union
+import numpy as np
+from PIL import Image
 
-from config import VLM_URL, VLM_MODEL, VLM_TIMEOUT, DESCRIBE_PROMPT, IDENTIFY_PROMPT
+from config import (
+    VLM_URL, VLM_MODEL, VLM_TIMEOUT, VLM_CACHE_CONTROL, VLM_GZIP,
+    VLM_IMAGE_MAX_SIDE, VLM_SHEET_MAX_SIDE, VLM_IMAGE_QUALITY, DESCRIBE_PROMPT, IDENTIFY_PROMPT
+)
 
+# An image argument: base64 JPEG, a data URI, or raw JPEG bytes
+ImageData = Union[str, bytes]
 
-def _get_headers() -> Dict[str, str]:
+# Responses kept for repeated (images, prompt) requests
+RESPONSE_CACHE_SIZE = 256
+# Downscaled images kept for reuse (the contact sheet is sent repeatedly)
+PREPARED_CACHE_SIZE = 32
+# Frames whose perceptual hashes differ in at most this many bits count as the same scene
+PHASH_DEDUP_DISTANCE = 5
+
+
+def _make_session() -> requests.Session:
+    """Create the pooled HTTP session used for all VLM requests."""
+    session = requests.Session()
+    # No adapter-level retries; _post() retries transient failures itself
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Shared across threads so requests reuse keep-alive connections
+_SESSION = _make_session()
+
+# Transient failures are retried with jittered exponential backoff
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.1
+RETRY_STATUSES = (502, 503, 504)
+
+
+def close_vlm_session():
+    """Close pooled VLM connections (call on shutdown)."""
+    _SESSION.close()
+
+
+class _LoopState:
+    """Async client and in-flight requests belonging to one event loop."""
+
+    __slots__ = ("client", "inflight")
+
+    def __init__(self):
+        self.client = httpx.AsyncClient(
+            timeout=VLM_TIMEOUT,
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=8),
+            http2=True,
+        )
+        # Requests currently being sent, so identical concurrent calls share
+        # one round trip (same keys as the response cache)
+        self.inflight: Dict[bytes, asyncio.Future] = {}
+
+
+# httpx clients and asyncio futures are tied to the loop they were created
+# on, so each running loop gets its own; entries go away with their loop
+_LOOP_STATE: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+_LOOP_STATE_LOCK = threading.Lock()
+
+
+def _loop_state() -> _LoopState:
+    """Get the running event loop's async state, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    with _LOOP_STATE_LOCK:
+        state = _LOOP_STATE.get(loop)
+        if state is None:
+            state = _LOOP_STATE[loop] = _LoopState()
+        return state
+
+
+def _get_async_client() -> httpx.AsyncClient:
+    """Get the running event loop's async HTTP client."""
+    return _loop_state().client
+
+
+async def aclose_vlm_client():
+    """Close the running event loop's async VLM client, if one was created."""
+    with _LOOP_STATE_LOCK:
+        state = _LOOP_STATE.pop(asyncio.get_running_loop(), None)
+    if state is not None:
+        await state.client.aclose()
+
+
+_RESP_CACHE: "OrderedDict[bytes, str]" = OrderedDict()
+_RESP_CACHE_LOCK = threading.Lock()
+
+
+def _image_digest(image: ImageData) -> bytes:
+    """XXH3 digest of an image argument's bytes."""
+    return xxhash.xxh3_128_digest(image if isinstance(image, bytes) else image.encode())
+
+
+def _fingerprint(images: List[ImageData], prompt: str, max_tokens: int) -> Tuple[bytes, List[bytes]]:
+    """
+    Fingerprint a stateless request by its model, images, prompt and token limit.
+
+    Computed once per request and used as the response cache key, the
+    single-flight key and the X-Prompt-Fingerprint header. XXH3 hashes at
+    memory speed, which matters for image payloads of hundreds of KB.
+
+    Returns:
+        Tuple of (request fingerprint, per-image digests). The image digests
+        key the downscale cache, so each image is only hashed once.
+    """
+    digests = [_image_digest(img) for img in images]
+    h = xxhash.xxh3_128()
+    h.update(VLM_MODEL.encode())
+    for digest in digests:
+        h.update(b"|")
+        h.update(digest)
+    h.update(b"|")
+    h.update(prompt.encode())
+    h.update(b"|%d" % max_tokens)
+    return h.digest(), digests
+
+
+def _cache_get(key: Optional[bytes]) -> Optional[str]:
+    """Look up a cached response, marking it most recently used."""
+    if key is None:
+        return None
+    with _RESP_CACHE_LOCK:
+        text = _RESP_CACHE.get(key)
+        if text is not None:
+            _RESP_CACHE.move_to_end(key)
+        return text
+
+
+def _cache_put(key: Optional[bytes], text: str):
+    """Store a response, evicting the least recently used beyond the limit."""
+    if key is None:
+        return
+    with _RESP_CACHE_LOCK:
+        _RESP_CACHE[key] = text
+        _RESP_CACHE.move_to_end(key)
+        while len(_RESP_CACHE) > RESPONSE_CACHE_SIZE:
+            _RESP_CACHE.popitem(last=False)
+
+
+# Requests currently being sent, so identical concurrent calls share one
+# round trip (same keys as the response cache)
+_INFLIGHT: Dict[bytes, Future] = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+
+def clear_vlm_cache():
+    """Drop all cached VLM responses."""
+    with _RESP_CACHE_LOCK:
+        _RESP_CACHE.clear()
+
+
+def _get_headers(fingerprint: Optional[bytes] = None) -> Dict[str, str]:
     """Get request headers, including auth for OpenAI."""
     headers = {"Content-Type": "application/json"}
+    if fingerprint is not None:
+        # Lets a caching proxy or server recognize repeated requests
+        headers["X-Prompt-Fingerprint"] = fingerprint.hex()
+    if VLM_GZIP:
+        headers["Content-Encoding"] = "gzip"
     # Add OpenAI auth if using their API
     if "openai.com" in VLM_URL:
         api_key = os.getenv("OPENAI_API_KEY")
@@ -18,28 +188,259 @@ def _get_headers() -> Dict[str, str]:
     return headers
 
 
+def _compress(body: bytes) -> bytes:
+    """Gzip a request body when VLM_GZIP is enabled (see _get_headers)."""
+    if VLM_GZIP:
+        # Level 1: most of the gain on base64 text for little CPU
+        return gzip.compress(body, compresslevel=1)
+    return body
+
+
 class VLMError(Exception):
     """Exception raised when VLM request fails."""
     pass
 
 
-def _make_image_content(b64_image: str) -> Dict[str, Any]:
-    """Create image content block for VLM request."""
+# User-facing VLMError messages for a timeout, a connection failure and an
+# unusable response; chat follow-ups have their own wording
+_ASK_ERRORS = (
+    "My brain is still waking up! Try again in a moment.",
+    "I can't reach my brain right now. Is the VLM server running?",
+    "Got a weird response from my brain. Try again?",
+)
+_CHAT_ERRORS = (
+    "Hmm, let me think... try asking again!",
+    "Lost connection to my brain! Try again?",
+    "Got confused there. Ask me again?",
+)
+
+
+def _choice_content(data: Any, field: str) -> Optional[str]:
+    """
+    Get choices[0][field]["content"] from a parsed completion.
+
+    Returns None instead of raising when any level is missing or has the
+    wrong type.
+    """
+    choices = data.get("choices") if isinstance(data, dict) else None
+    if not choices or not isinstance(choices, list):
+        return None
+    part = choices[0].get(field) if isinstance(choices[0], dict) else None
+    content = part.get("content") if isinstance(part, dict) else None
+    return content if isinstance(content, str) else None
+
+
+_DATA_URI_PREFIX = "data:image/jpeg;base64,"
+
+
+# Downscaled images by (digest, max side); images already within the
+# limit are not stored
+_PREPARED: "OrderedDict[Tuple[bytes, int], bytes]" = OrderedDict()
+_PREPARED_LOCK = threading.Lock()
+
+# Base64 characters decoded to read a JPEG's size (48 KB of data, enough
+# for the frame header unless the image carries unusually large metadata)
+_HEADER_B64_CHARS = 64 * 1024
+
+
+def _image_size(image: ImageData) -> Tuple[int, int]:
+    """
+    Read an image's dimensions from its header.
+
+    For base64 input only the start of the string is decoded; the whole
+    image is decoded only if the header isn't found there.
+    """
+    if isinstance(image, str) and len(image) > _HEADER_B64_CHARS and not image.startswith("data:"):
+        try:
+            return Image.open(io.BytesIO(pybase64.b64decode(image[:_HEADER_B64_CHARS]))).size
+        except (OSError, ValueError):
+            pass
+    return Image.open(io.BytesIO(_jpeg_bytes(image))).size
+
+
+def _prepare_image(
+    image: ImageData,
+    digest: Optional[bytes] = None,
+    max_side: int = VLM_IMAGE_MAX_SIDE
+) -> ImageData:
+    """
+    Shrink an image whose long side exceeds max_side.
+
+    The model downsamples large inputs anyway, so the extra pixels only
+    cost upload and server preprocessing time. Images within the limit,
+    and anything PIL can't read, are returned unchanged.
+
+    Args:
+        image: Raw JPEG bytes or base64 JPEG
+        digest: The image's _image_digest, if the caller already has it
+        max_side: Longest side to send
+
+    Returns:
+        Re-encoded JPEG bytes, or the input unchanged
+    """
+    key = (digest if digest is not None else _image_digest(image), max_side)
+    with _PREPARED_LOCK:
+        prepared = _PREPARED.get(key)
+        if prepared is not None:
+            _PREPARED.move_to_end(key)
+            return prepared
+
+    try:
+        if max(_image_size(image)) <= max_side:
+            return image
+        img = Image.open(io.BytesIO(_jpeg_bytes(image)))
+        # Decode at a reduced DCT scale where possible, then resize
+        img.draft("RGB", (max_side, max_side))
+        img = img.convert("RGB")
+        img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=VLM_IMAGE_QUALITY)
+        prepared = buf.getvalue()
+    except (OSError, ValueError):
+        return image
+
+    with _PREPARED_LOCK:
+        _PREPARED[key] = prepared
+        while len(_PREPARED) > PREPARED_CACHE_SIZE:
+            _PREPARED.popitem(last=False)
+    return prepared
+
+
+def to_data_uri(image: ImageData, max_side: int = VLM_IMAGE_MAX_SIDE) -> str:
+    """
+    Turn a base64 JPEG or raw JPEG bytes into a data URI, downscaling it
+    to max_side for the model first; data URIs are returned unchanged.
+
+    Callers that send the same image more than once (e.g. identification
+    followed by the conversation history) can convert it once up front.
+    Raw bytes are base64-encoded here, just before the request is built.
+    Pass VLM_SHEET_MAX_SIDE for the contact sheet.
+    """
+    if isinstance(image, str) and image.startswith("data:"):
+        return image
+    image = _prepare_image(image, max_side=max_side)
+    if isinstance(image, bytes):
+        return _DATA_URI_PREFIX + pybase64.b64encode_as_string(image)
+    return _DATA_URI_PREFIX + image
+
+
+def _jpeg_bytes(image: ImageData) -> bytes:
+    """Get the raw JPEG bytes of an image argument."""
+    if isinstance(image, bytes):
+        return image
+    return pybase64.b64decode(image.partition(",")[2] if image.startswith("data:") else image)
+
+
+def _sheet_uri(contact_sheet: ImageData) -> str:
+    """Data URI of a contact sheet, downscaled to VLM_SHEET_MAX_SIDE at most."""
+    return to_data_uri(contact_sheet, VLM_SHEET_MAX_SIDE)
+
+
+def _make_image_content_raw(data_uri: str) -> Dict[str, Any]:
+    """Create image content block from a ready-made data URI."""
     return {
         "type": "image_url",
         "image_url": {
-            "url": f"data:image/jpeg;base64,{b64_image}"
+            "url": data_uri
         }
     }
 
 
+def _make_image_content(image: ImageData) -> Dict[str, Any]:
+    """Create image content block for VLM request."""
+    return _make_image_content_raw(to_data_uri(image))
+
+
 def _make_text_content(text: str) -> Dict[str, Any]:
     """Create text content block for VLM request."""
     return {"type": "text", "text": text}
 
 
+def _build_messages(
+    images: List[ImageData],
+    prompt: str,
+    conversation: Optional[List[Dict]] = None
+) -> List[Dict]:
+    """Build the messages list for a VLM request: history, then images and prompt."""
+    # Build content list: images first, then prompt
+    content = []
+    for img in images:
+        content.append(_make_image_content(img))
+    content.append(_make_text_content(prompt))
+
+    # Build messages list
+    messages = []
+    if conversation:
+        messages.extend(conversation)
+    messages.append({"role": "user", "content": content})
+    return messages
+
+
+def _build_payload(messages: List[Dict], max_tokens: int, stream: bool = False) -> Dict:
+    """Build the chat completions request body."""
+    payload = {
+        "model": VLM_MODEL,
+        "max_tokens": max_tokens,
+        "messages": messages,
+    }
+    if stream:
+        payload["stream"] = True
+    return payload
+
+
+def _json_image_url(image: ImageData, digest: Optional[bytes] = None) -> bytes:
+    """JSON string literal for an image's data URI (see to_data_uri)."""
+    if isinstance(image, str) and image.startswith("data:"):
+        return orjson.dumps(image)
+    image = _prepare_image(image, digest)
+    if isinstance(image, bytes):
+        # Base64 output needs no JSON escaping
+        return b'"' + _DATA_URI_PREFIX.encode() + pybase64.b64encode(image) + b'"'
+    # Caller-supplied strings are escaped in case they are not clean base64
+    return orjson.dumps(_DATA_URI_PREFIX + image)
+
+
+def _encode_request(
+    images: List[ImageData],
+    prompt: str,
+    max_tokens: int,
+    conversation: Optional[List[Dict]] = None,
+    stream: bool = False,
+    digests: Optional[List[bytes]] = None
+) -> bytes:
+    """
+    Serialize a VLM request body.
+
+    Single-turn requests always have the same shape, so their JSON is
+    assembled from byte fragments without building the message dicts; the
+    output matches orjson.dumps(_build_payload(...)) byte for byte.
+    Requests with conversation history go through the dict path.
+    digests are the images' digests from _fingerprint, if computed.
+    """
+    if conversation:
+        messages = _build_messages(images, prompt, conversation)
+        return orjson.dumps(_build_payload(messages, max_tokens, stream))
+
+    parts = [
+        b'{"model":', orjson.dumps(VLM_MODEL),
+        b',"max_tokens":', str(max_tokens).encode(),
+        b',"messages":[{"role":"user","content":[',
+    ]
+    for img, digest in zip(images, digests or [None] * len(images)):
+        parts.append(b'{"type":"image_url","image_url":{"url":')
+        parts.append(_json_image_url(img, digest))
+        parts.append(b'}},')
+    parts.append(b'{"type":"text","text":')
+    parts.append(orjson.dumps(prompt))
+    parts.append(b'}]}]')
+    if stream:
+        parts.append(b',"stream":true')
+    parts.append(b'}')
+    return b"".join(parts)
+
+
 def ask_model(
-    images: List[str],
+    images: List[ImageData],
     prompt: str,
     max_tokens: int = 200,
     conversation: Optional[List[Dict]] = None
@@ -48,7 +449,7 @@ def ask_model(
     Send images and prompt to the VLM.
 
     Args:
-        images: List of base64-encoded JPEG images
+        images: List of JPEG images (base64, data URI, or raw bytes)
         prompt: Text prompt to send with images
         max_tokens: Maximum response tokens
         conversation: Optional previous conversation history
@@ -59,84 +460,687 @@ def ask_model(
     Raises:
         VLMError: If request fails
     """
-    # Build content list: images first, then prompt
-    content = []
-    for img in images:
-        content.append(_make_image_content(img))
-    content.append(_make_text_content(prompt))
-
-    # Build messages list
-    messages = []
+    # Only stateless requests are cached; a conversation changes the answer
     if conversation:
-        messages.extend(conversation)
-    messages.append({"role": "user", "content": content})
+        body = _encode_request(images, prompt, max_tokens, conversation)
+        return _post_completion(body, xxhash.xxh3_128_digest(body))
+
+    key, digests = _fingerprint(images, prompt, max_tokens)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
+    # If the same request is already in flight, wait for its response
+    with _INFLIGHT_LOCK:
+        pending = _INFLIGHT.get(key)
+        leader = pending is None
+        if leader:
+            pending = _INFLIGHT[key] = Future()
+    if not leader:
+        return pending.result()
 
     try:
-        resp = requests.post(
-            VLM_URL,
-            headers=_get_headers(),
-            json={
-                "model": VLM_MODEL,
-                "max_tokens": max_tokens,
-                "messages": messages,
-            },
-            timeout=VLM_TIMEOUT,
-        )
-        resp.raise_for_status()
-        return resp.json()["choices"][0]["message"]["content"]
+        text = _post_completion(_encode_request(images, prompt, max_tokens, digests=digests), key)
+        _cache_put(key, text)
+        pending.set_result(text)
+        return text
+    except BaseException as e:
+        pending.set_exception(e)
+        raise
+    finally:
+        with _INFLIGHT_LOCK:
+            del _INFLIGHT[key]
+
+
+def _retry_delay(attempt: int) -> float:
+    """Backoff before retry number attempt + 1, jittered to spread out clients."""
+    return RETRY_BASE_DELAY * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def _retryable(e: Exception) -> bool:
+    """
+    Check whether a failed request is worth retrying.
+
+    Connection failures and gateway errors mean the server never worked on
+    the request. A read timeout is not retried: the model may still be
+    generating, and a retry would only wait that long again.
+    """
+    if isinstance(e, (httpx.HTTPStatusError, requests.HTTPError)):
+        return e.response is not None and e.response.status_code in RETRY_STATUSES
+    if isinstance(e, requests.ConnectionError):
+        return not isinstance(e, requests.ReadTimeout)
+    return isinstance(e, (requests.ConnectTimeout, httpx.ConnectError, httpx.ConnectTimeout))
+
+
+def _post(body: bytes, fingerprint: Optional[bytes] = None, stream: bool = False) -> requests.Response:
+    """
+    POST a request body to the VLM, retrying transient failures.
+
+    Returns:
+        The successful response
+
+    Raises:
+        requests.RequestException: If the last attempt fails or the error
+            is not transient
+    """
+    data = _compress(body)
+    for attempt in range(RETRY_ATTEMPTS):
+        try:
+            resp = _SESSION.post(
+                VLM_URL,
+                headers=_get_headers(fingerprint),
+                data=data,
+                timeout=VLM_TIMEOUT,
+                stream=stream,
+            )
+            resp.raise_for_status()
+            return resp
+        except requests.RequestException as e:
+            if attempt == RETRY_ATTEMPTS - 1 or not _retryable(e):
+                raise
+            if e.response is not None:
+                e.response.close()
+            time.sleep(_retry_delay(attempt))
+
+
+async def _apost(body: bytes, fingerprint: Optional[bytes] = None) -> httpx.Response:
+    """Async variant of _post."""
+    content = _compress(body)
+    for attempt in range(RETRY_ATTEMPTS):
+        try:
+            resp = await _get_async_client().post(
+                VLM_URL,
+                headers=_get_headers(fingerprint),
+                content=content,
+            )
+            resp.raise_for_status()
+            return resp
+        except httpx.HTTPError as e:
+            if attempt == RETRY_ATTEMPTS - 1 or not _retryable(e):
+                raise
+            await asyncio.sleep(_retry_delay(attempt))
+
+
+def _post_completion(body: bytes, fingerprint: Optional[bytes] = None) -> str:
+    """
+    POST a chat completion and return the response text.
+
+    Args:
+        body: Serialized request body
+        fingerprint: Request fingerprint to send as a header, if any
+
+    Raises:
+        VLMError: If request fails
+    """
+    try:
+        resp = _post(body, fingerprint)
+        text = _choice_content(orjson.loads(resp.content), "message")
     except requests.Timeout:
         raise VLMError("My brain is still waking up! Try again in a moment.")
     except requests.ConnectionError:
         raise VLMError("I can't reach my brain right now. Is the VLM server running?")
     except requests.RequestException as e:
         raise VLMError(f"Something went wrong: {e}")
-    except (KeyError, IndexError):
+    except ValueError:
         raise VLMError("Got a weird response from my brain. Try again?")
 
+    if text is None:
+        raise VLMError("Got a weird response from my brain. Try again?")
+    return text
+
+
+def _stream_completion(
+    body: bytes,
+    fingerprint: Optional[bytes] = None,
+    errors: Tuple[str, str, str] = _ASK_ERRORS
+) -> Iterator[str]:
+    """
+    POST a streaming chat completion and yield content fragments as they arrive.
+
+    Args:
+        body: Serialized request body with "stream": true
+        fingerprint: Request fingerprint to send as a header, if any
+        errors: VLMError messages for timeout, connection failure and bad
+            response (_ASK_ERRORS or _CHAT_ERRORS)
+
+    Raises:
+        VLMError: If request fails, the server reports an error mid-stream,
+            or the stream ends without any content
+    """
+    received = False
+    try:
+        with _post(body, fingerprint, stream=True) as resp:
+            # Server-sent events: "data: {json}" lines, ending with "data: [DONE]"
+            for line in resp.iter_lines():
+                if not line.startswith(b"data: "):
+                    continue
+                data = line[6:]
+                if data == b"[DONE]":
+                    break
+                chunk = orjson.loads(data)
+                if not isinstance(chunk, dict) or "error" in chunk or not isinstance(chunk.get("choices"), list):
+                    raise VLMError(errors[2])
+                # Chunks without content (role header, usage) are skipped
+                content = _choice_content(chunk, "delta")
+                if content:
+                    received = True
+                    yield content
+    except requests.Timeout:
+        raise VLMError(errors[0])
+    except requests.ConnectionError:
+        raise VLMError(errors[1])
+    except requests.RequestException as e:
+        raise VLMError(f"Something went wrong: {e}")
+    except ValueError:
+        raise VLMError(errors[2])
 
-def describe_scene(frame_b64: str) -> str:
+    if not received:
+        raise VLMError(errors[2])
+
+
+def ask_model_stream(
+    images: List[ImageData],
+    prompt: str,
+    max_tokens: int = 200,
+    conversation: Optional[List[Dict]] = None
+) -> Iterator[str]:
+    """
+    Send images and prompt to the VLM and yield the response as it streams in.
+
+    Args:
+        images: List of JPEG images (base64, data URI, or raw bytes)
+        prompt: Text prompt to send with images
+        max_tokens: Maximum response tokens
+        conversation: Optional previous conversation history
+
+    Yields:
+        Text fragments of the model's response, in order
+
+    Raises:
+        VLMError: If request fails
+    """
+    if conversation:
+        body = _encode_request(images, prompt, max_tokens, conversation, stream=True)
+        yield from _stream_completion(body, xxhash.xxh3_128_digest(body))
+        return
+
+    key, digests = _fingerprint(images, prompt, max_tokens)
+    cached = _cache_get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    parts = []
+    body = _encode_request(images, prompt, max_tokens, stream=True, digests=digests)
+    for part in _stream_completion(body, key):
+        parts.append(part)
+        yield part
+
+    # Only a complete, non-empty response is cached; errors raise before
+    # reaching here and a consumer that stops early never gets here
+    text = "".join(parts)
+    if text:
+        _cache_put(key, text)
+
+
+async def ask_model_async(
+    images: List[ImageData],
+    prompt: str,
+    max_tokens: int = 200,
+    conversation: Optional[List[Dict]] = None
+) -> str:
+    """
+    Async variant of ask_model; concurrent calls share one connection pool.
+
+    Args:
+        images: List of JPEG images (base64, data URI, or raw bytes)
+        prompt: Text prompt to send with images
+        max_tokens: Maximum response tokens
+        conversation: Optional previous conversation history
+
+    Returns:
+        Model's text response
+
+    Raises:
+        VLMError: If request fails
+    """
+    if conversation:
+        body = _encode_request(images, prompt, max_tokens, conversation)
+        return await _apost_completion(body, xxhash.xxh3_128_digest(body))
+
+    key, digests = _fingerprint(images, prompt, max_tokens)
+    cached = _cache_get(key)
+    if cached is not None:
+        return cached
+
+    # Single-flight within the event loop; no lock needed since nothing
+    # awaits between the lookup and the insert. The request runs as its own
+    # task and every caller awaits it through shield(), so cancelling any
+    # caller (including the first) leaves the others waiting on it.
+    inflight = _loop_state().inflight
+    task = inflight.get(key)
+    if task is None:
+        task = inflight[key] = asyncio.ensure_future(
+            _ask_model_shared(_encode_request(images, prompt, max_tokens, digests=digests), key)
+        )
+
+        def _forget(done: asyncio.Future):
+            del inflight[key]
+            # Mark retrieved so a failure nobody awaited does not log a warning
+            if not done.cancelled():
+                done.exception()
+
+        task.add_done_callback(_forget)
+    return await asyncio.shield(task)
+
+
+async def _ask_model_shared(body: bytes, key: bytes) -> str:
+    """Send a single-flight request and cache its response."""
+    text = await _apost_completion(body, key)
+    _cache_put(key, text)
+    return text
+
+
+async def _apost_completion(body: bytes, fingerprint: Optional[bytes] = None) -> str:
+    """
+    Async variant of _post_completion.
+
+    Raises:
+        VLMError: If request fails
+    """
+    try:
+        resp = await _apost(body, fingerprint)
+        text = _choice_content(orjson.loads(resp.content), "message")
+    except httpx.TimeoutException:
+        raise VLMError("My brain is still waking up! Try again in a moment.")
+    except httpx.ConnectError:
+        raise VLMError("I can't reach my brain right now. Is the VLM server running?")
+    except (httpx.HTTPError, RuntimeError) as e:
+        # RuntimeError: the loop or transport was closed under the request
+        raise VLMError(f"Something went wrong: {e}")
+    except ValueError:
+        raise VLMError("Got a weird response from my brain. Try again?")
+
+    if text is None:
+        raise VLMError("Got a weird response from my brain. Try again?")
+    return text
+
+
+class VLMBatcher:
+    """
+    Collects VLM requests from many threads and sends them together.
+
+    Requests are gathered for up to max_wait seconds (or until max_batch
+    are waiting) and then sent concurrently over the loop's async client,
+    so bursts from several callers go out back to back on pooled
+    connections. The batcher runs its own event loop thread, with its own
+    client, separate from ask_model_async calls made on other loops.
+    """
+
+    def __init__(self, max_batch: int = 8, max_wait: float = 0.01):
+        self._max_batch = max_batch
+        self._max_wait = max_wait
+        self._loop = asyncio.new_event_loop()
+        self._queue: Optional[asyncio.Queue] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="vlm-batcher")
+        self._thread.start()
+        self._started.wait()
+
+    def _run(self):
+        """Event loop thread."""
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue()
+        self._collector = self._loop.create_task(self._collect())
+        self._started.set()
+        self._loop.run_forever()
+
+    async def _collect(self):
+        """Group queued requests into batches and dispatch them."""
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self._max_wait
+            while len(batch) < self._max_batch:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Don't hold up the next batch while this one is in flight
+            self._loop.create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch: List[tuple]):
+        """Send a batch concurrently and route each result to its caller."""
+        results = await asyncio.gather(
+            *(ask_model_async(images, prompt, max_tokens) for _, images, prompt, max_tokens in batch),
+            return_exceptions=True
+        )
+        for (future, *_), result in zip(batch, results):
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def submit(self, images: List[ImageData], prompt: str, max_tokens: int = 200) -> Future:
+        """
+        Queue a stateless request.
+
+        Args:
+            images: List of JPEG images (base64, data URI, or raw bytes)
+            prompt: Text prompt to send with images
+            max_tokens: Maximum response tokens
+
+        Returns:
+            Future resolving to the model's text response (or VLMError)
+        """
+        future = Future()
+        self._loop.call_soon_threadsafe(
+            self._queue.put_nowait, (future, images, prompt, max_tokens)
+        )
+        return future
+
+    def ask(self, images: List[ImageData], prompt: str, max_tokens: int = 200) -> str:
+        """Blocking equivalent of ask_model that goes through the batcher."""
+        return self.submit(images, prompt, max_tokens).result()
+
+    def close(self):
+        """Close the batcher loop's async client, stop the loop thread and close the loop."""
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    async def _shutdown(self):
+        """Cancel the collector and close the client, on the loop thread."""
+        self._collector.cancel()
+        try:
+            await self._collector
+        except asyncio.CancelledError:
+            pass
+        await aclose_vlm_client()
+
+
+# 32-point orthonormal DCT-II basis for the perceptual hash
+_DCT_N = 32
+_DCT = np.cos(np.pi * (2 * np.arange(_DCT_N) + 1) * np.arange(_DCT_N)[:, None] / (2 * _DCT_N))
+_DCT[0] /= np.sqrt(2)
+_DCT *= np.sqrt(2 / _DCT_N)
+
+# Last described frame, for describe_scene(dedup=True)
+_last_phash: Optional[int] = None
+_last_description: Optional[str] = None
+_dedup_lock = threading.Lock()
+
+
+def _phash(image: ImageData) -> int:
+    """
+    Compute a 64-bit perceptual hash of a JPEG.
+
+    The image is reduced to 32x32 grayscale, transformed with a 2-D DCT,
+    and the 8x8 lowest frequencies are thresholded at their median.
+    """
+    img = Image.open(io.BytesIO(_jpeg_bytes(image)))
+    img.draft("L", (_DCT_N, _DCT_N))
+    small = img.convert("L").resize((_DCT_N, _DCT_N), Image.Resampling.BILINEAR)
+    pixels = np.asarray(small, dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:8, :8].flatten()
+    bits = low > np.median(low)
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def _dedup_lookup(image: ImageData) -> tuple[int, Optional[str]]:
+    """Hash a frame and return the last description if the scene is unchanged."""
+    phash = _phash(image)
+    with _dedup_lock:
+        if _last_phash is not None and bin(phash ^ _last_phash).count("1") <= PHASH_DEDUP_DISTANCE:
+            return phash, _last_description
+    return phash, None
+
+
+def _dedup_store(phash: int, description: str):
+    """Remember the description of the last frame sent to the model."""
+    global _last_phash, _last_description
+    with _dedup_lock:
+        _last_phash = phash
+        _last_description = description
+
+
+def describe_scene(frame_b64: ImageData, dedup: bool = False) -> str:
     """
     Get a scene description for a single frame.
 
     Args:
-        frame_b64: Base64-encoded JPEG of the current frame
+        frame_b64: JPEG of the current frame (base64, data URI, or raw bytes)
+        dedup: Reuse the previous description when the frame looks the same
 
     Returns:
         Friendly scene description
     """
-    return ask_model([frame_b64], DESCRIBE_PROMPT, max_tokens=300)
+    if not dedup:
+        return ask_model([frame_b64], DESCRIBE_PROMPT, max_tokens=300)
+
+    phash, previous = _dedup_lookup(frame_b64)
+    if previous is not None:
+        return previous
+    description = ask_model([frame_b64], DESCRIBE_PROMPT, max_tokens=300)
+    _dedup_store(phash, description)
+    return description
 
 
 def identify_subjects(
-    contact_sheet_b64: str,
-    frame_b64: str,
+    contact_sheet_b64: ImageData,
+    frame_b64: ImageData,
     conversation: Optional[List[Dict]] = None
 ) -> str:
     """
     Identify subjects in a frame using the contact sheet as reference.
 
     Args:
-        contact_sheet_b64: Base64-encoded contact sheet image
-        frame_b64: Base64-encoded JPEG of the current frame
+        contact_sheet_b64: Contact sheet JPEG (base64, data URI, or raw bytes)
+        frame_b64: JPEG of the current frame (base64, data URI, or raw bytes)
         conversation: Optional previous conversation for follow-ups
 
     Returns:
         Identification and description response
     """
     return ask_model(
-        [contact_sheet_b64, frame_b64],
+        [_sheet_uri(contact_sheet_b64), frame_b64],
         IDENTIFY_PROMPT,
         max_tokens=400,
         conversation=conversation
     )
 
 
+async def describe_and_identify_async(
+    frame_b64: ImageData,
+    contact_sheet_b64: ImageData
+) -> tuple[str, str]:
+    """
+    Describe a frame and identify its subjects concurrently.
+
+    Both requests go out together over the loop's async client. Against
+    an https:// server that negotiates HTTP/2 they share one connection;
+    a plain http:// URL gets HTTP/1.1 (httpx doesn't do h2c), so they use
+    two pooled connections side by side.
+
+    Args:
+        frame_b64: JPEG of the current frame (base64, data URI, or raw bytes)
+        contact_sheet_b64: Contact sheet JPEG (base64, data URI, or raw bytes)
+
+    Returns:
+        Tuple of (scene description, identification response)
+
+    Raises:
+        VLMError: If either request fails
+    """
+    description, identification = await asyncio.gather(
+        ask_model_async([frame_b64], DESCRIBE_PROMPT, max_tokens=300),
+        ask_model_async([_sheet_uri(contact_sheet_b64), frame_b64], IDENTIFY_PROMPT, max_tokens=400),
+    )
+    return description, identification
+
+
+def identify_subjects_pipelined(
+    frames: Iterable[ImageData],
+    contact_sheet_b64: ImageData,
+    max_inflight: int = 2
+) -> Iterator[str]:
+    """
+    Identify subjects in a sequence of frames, overlapping the requests.
+
+    While one response is awaited, the next frames are already being
+    encoded, looked up in the cache and sent. Results are yielded in frame
+    order.
+
+    Args:
+        frames: JPEG frames (base64, data URI, or raw bytes)
+        contact_sheet_b64: Contact sheet JPEG, shared by every request
+        max_inflight: Maximum number of requests outstanding at once (one
+            worker thread each, for the duration of the call)
+
+    Yields:
+        Identification response for each frame, in order
+
+    Raises:
+        VLMError: If a request fails
+    """
+    sheet = _sheet_uri(contact_sheet_b64)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="vlm") as pool:
+        for frame in frames:
+            if len(pending) >= max_inflight:
+                yield pending.popleft().result()
+            pending.append(pool.submit(
+                ask_model, [sheet, frame], IDENTIFY_PROMPT, 400
+            ))
+        while pending:
+            yield pending.popleft().result()
+
+
+def describe_scene_stream(frame_b64: ImageData, dedup: bool = False) -> Iterator[str]:
+    """Streaming variant of describe_scene; yields text fragments."""
+    if not dedup:
+        return ask_model_stream([frame_b64], DESCRIBE_PROMPT, max_tokens=300)
+    return _describe_scene_stream_dedup(frame_b64)
+
+
+def _describe_scene_stream_dedup(frame_b64: ImageData) -> Iterator[str]:
+    """describe_scene_stream with perceptual-hash dedup."""
+    phash, previous = _dedup_lookup(frame_b64)
+    if previous is not None:
+        yield previous
+        return
+    parts = []
+    for part in ask_model_stream([frame_b64], DESCRIBE_PROMPT, max_tokens=300):
+        parts.append(part)
+        yield part
+    description = "".join(parts)
+    if description:
+        _dedup_store(phash, description)
+
+
+def identify_subjects_stream(contact_sheet_b64: ImageData, frame_b64: ImageData) -> Iterator[str]:
+    """Streaming variant of identify_subjects; yields text fragments."""
+    return ask_model_stream([_sheet_uri(contact_sheet_b64), frame_b64], IDENTIFY_PROMPT, max_tokens=400)
+
+
+class Conversation:
+    """
+    Chat history together with its serialized JSON.
+
+    Follow-up requests resend the whole history, including both images.
+    Keeping the encoded messages means a new turn only serializes the new
+    message and joins bytes. Instances are immutable; extend() returns a
+    new one, so the cached encoding can never go stale. The XXH3 state of
+    the encoding is kept too, so a request fingerprint only hashes the new
+    turn rather than both images again.
+    """
+
+    __slots__ = ("messages", "_encoded", "_hash")
+
+    def __init__(
+        self,
+        messages: List[Dict],
+        encoded: Optional[bytes] = None,
+        hash_state: Optional["xxhash.xxh3_128"] = None
+    ):
+        self.messages = list(messages)
+        # Comma-separated JSON of the messages, without the enclosing brackets
+        self._encoded = encoded if encoded is not None else b",".join(
+            orjson.dumps(m) for m in self.messages
+        )
+        self._hash = hash_state if hash_state is not None else xxhash.xxh3_128(self._encoded)
+
+    @classmethod
+    def of(cls, conversation: Union["Conversation", List[Dict]]) -> "Conversation":
+        """Wrap a plain message list; Conversations are returned as-is."""
+        if isinstance(conversation, cls):
+            return conversation
+        return cls(conversation)
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def request_body(self, user_message: str, max_tokens: int, stream: bool = False) -> bytes:
+        """
+        Serialize a request for the next turn.
+
+        The output matches orjson.dumps(_build_payload(...)) for the history
+        plus the new user message.
+        """
+        parts = [
+            b'{"model":', orjson.dumps(VLM_MODEL),
+            b',"max_tokens":', str(max_tokens).encode(),
+            b',"messages":[', self._encoded,
+        ]
+        if self._encoded:
+            parts.append(b",")
+        parts.append(orjson.dumps({"role": "user", "content": user_message}))
+        parts.append(b"]")
+        if stream:
+            parts.append(b',"stream":true')
+        parts.append(b"}")
+        return b"".join(parts)
+
+    def fingerprint(self, user_message: str, max_tokens: int) -> bytes:
+        """Fingerprint the request for the next turn (see _fingerprint)."""
+        h = self._hash.copy()
+        h.update(b"|")
+        h.update(VLM_MODEL.encode())
+        h.update(b"|")
+        h.update(user_message.encode())
+        h.update(b"|%d" % max_tokens)
+        return h.digest()
+
+    def extend(self, user_message: str, response_text: str) -> "Conversation":
+        """Return a new Conversation with a completed turn appended."""
+        turn = [
+            {"role": "user", "content": user_message},
+            {"role": "assistant", "content": response_text},
+        ]
+        turn_encoded = b",".join(orjson.dumps(m) for m in turn)
+        hash_state = self._hash.copy()
+        if self._encoded:
+            hash_state.update(b",")
+            encoded = self._encoded + b"," + turn_encoded
+        else:
+            encoded = turn_encoded
+        hash_state.update(turn_encoded)
+        return Conversation(self.messages + turn, encoded, hash_state)
+
+
 def chat_followup(
     contact_sheet_b64: str,
     frame_b64: str,
     user_message: str,
-    conversation: List[Dict]
-) -> tuple[str, List[Dict]]:
+    conversation: Union[Conversation, List[Dict]]
+) -> tuple[str, Union[Conversation, List[Dict]]]:
     """
     Handle a follow-up chat message about the current scene.
 
@@ -147,77 +1151,137 @@ def chat_followup(
         conversation: Previous conversation history
 
     Returns:
-        Tuple of (response text, updated conversation history)
+        Tuple of (response text, updated conversation history of the same
+        type as conversation)
     """
     # The conversation already contains the images in the first user message,
-    # so we just need to add the new text-only message
-    updated_conversation = conversation.copy()
-    updated_conversation.append({
-        "role": "user",
-        "content": user_message
-    })
+    # so we just need to add the new text-only message. Earlier messages are
+    # shared, never modified, so the request prefix stays byte-identical
+    # across turns and the server's prefix cache can reuse it.
+    history = Conversation.of(conversation)
 
     try:
-        resp = requests.post(
-            VLM_URL,
-            headers=_get_headers(),
-            json={
-                "model": VLM_MODEL,
-                "max_tokens": 300,
-                "messages": updated_conversation,
-            },
-            timeout=VLM_TIMEOUT,
-        )
-        resp.raise_for_status()
-        response_text = resp.json()["choices"][0]["message"]["content"]
-
-        # Add assistant response to conversation
-        updated_conversation.append({
-            "role": "assistant",
-            "content": response_text
-        })
-
-        return response_text, updated_conversation
-
+        resp = _post(history.request_body(user_message, 300), history.fingerprint(user_message, 300))
+        response_text = _choice_content(orjson.loads(resp.content), "message")
     except requests.Timeout:
         raise VLMError("Hmm, let me think... try asking again!")
     except requests.ConnectionError:
         raise VLMError("Lost connection to my brain! Try again?")
     except requests.RequestException as e:
         raise VLMError(f"Something went wrong: {e}")
-    except (KeyError, IndexError):
+    except ValueError:
         raise VLMError("Got confused there. Ask me again?")
 
+    if response_text is None:
+        raise VLMError("Got confused there. Ask me again?")
+    return response_text, extend_conversation(conversation, user_message, response_text)
 
-def build_initial_conversation(
+
+async def chat_followup_async(
+    contact_sheet_b64: str,
+    frame_b64: str,
+    user_message: str,
+    conversation: Union[Conversation, List[Dict]]
+) -> tuple[str, Union[Conversation, List[Dict]]]:
+    """Async variant of chat_followup; same arguments and return value."""
+    history = Conversation.of(conversation)
+
+    try:
+        resp = await _apost(history.request_body(user_message, 300), history.fingerprint(user_message, 300))
+        response_text = _choice_content(orjson.loads(resp.content), "message")
+    except httpx.TimeoutException:
+        raise VLMError("Hmm, let me think... try asking again!")
+    except httpx.ConnectError:
+        raise VLMError("Lost connection to my brain! Try again?")
+    except (httpx.HTTPError, RuntimeError) as e:
+        raise VLMError(f"Something went wrong: {e}")
+    except ValueError:
+        raise VLMError("Got confused there. Ask me again?")
+
+    if response_text is None:
+        raise VLMError("Got confused there. Ask me again?")
+    return response_text, extend_conversation(conversation, user_message, response_text)
+
+
+def chat_followup_stream(
     contact_sheet_b64: str,
     frame_b64: str,
+    user_message: str,
+    conversation: Union[Conversation, List[Dict]]
+) -> Iterator[str]:
+    """
+    Streaming variant of chat_followup; yields text fragments.
+
+    The conversation is not extended; once the stream is exhausted, pass the
+    joined text to extend_conversation() to get the updated history.
+    """
+    history = Conversation.of(conversation)
+    body = history.request_body(user_message, 300, stream=True)
+    return _stream_completion(body, history.fingerprint(user_message, 300), _CHAT_ERRORS)
+
+
+def extend_conversation(
+    conversation: Union[Conversation, List[Dict]],
+    user_message: str,
+    response_text: str
+) -> Union[Conversation, List[Dict]]:
+    """
+    Append a completed chat turn to a conversation.
+
+    Args:
+        conversation: Previous conversation history (not modified)
+        user_message: User's follow-up question
+        response_text: The model's full response
+
+    Returns:
+        Updated conversation history, of the same type as conversation
+    """
+    if isinstance(conversation, Conversation):
+        return conversation.extend(user_message, response_text)
+    return [
+        *conversation,
+        {"role": "user", "content": user_message},
+        {"role": "assistant", "content": response_text},
+    ]
+
+
+def build_initial_conversation(
+    contact_sheet_b64: ImageData,
+    frame_b64: ImageData,
     initial_response: str
-) -> List[Dict]:
+) -> Conversation:
     """
     Build the initial conversation history after identification.
 
-    This is used to set up the context for follow-up questions.
+    This is used to set up the context for follow-up questions. Callers
+    should keep the returned Conversation and extend it on each turn rather
+    than rebuilding the image blocks; that keeps the images' JSON encoded
+    once and lets servers with prefix caching reuse them. With VLM_CACHE_CONTROL set, the first message
+    is also marked as a cache breakpoint for APIs that need one.
 
     Args:
-        contact_sheet_b64: Base64-encoded contact sheet
-        frame_b64: Base64-encoded frame
+        contact_sheet_b64: Contact sheet JPEG (base64, data URI, or raw bytes)
+        frame_b64: Frame JPEG (base64, data URI, or raw bytes)
         initial_response: The initial identification response
 
     Returns:
-        Conversation history list
+        Conversation history
     """
-    return [
+    prompt = _make_text_content(IDENTIFY_PROMPT)
+    if VLM_CACHE_CONTROL:
+        prompt["cache_control"] = {"type": "ephemeral"}
+
+    return Conversation([
         {
             "role": "user",
             "content": [
-                _make_image_content(contact_sheet_b64),
+                _make_image_content_raw(_sheet_uri(contact_sheet_b64)),
                 _make_image_content(frame_b64),
-                _make_text_content(IDENTIFY_PROMPT)
+                prompt
             ]
         },
         {
             "role": "assistant",
             "content": initial_response
         }
-    ]
+    ])